@@ -4,14 +4,644 @@ CHATBOT LEGAL - Asistente especializado en normativa colombiana
 Usa Groq para consultas inteligentes con contexto restrictivo
 """
 
+import hashlib
+import heapq
 import os
 import re
 import sqlite3
-from typing import Dict, Any, List, Optional
+import time
+from bisect import bisect_right
+from collections import Counter, namedtuple
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from groq import Groq
 from openai import OpenAI
 
 
+def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+    """Compilar un grupo de palabras clave en una sola alternancia (un recorrido por texto)"""
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in ordered))
+
+
+# Grupos de palabras clave usados por los extractores (equivalen a any(kw in texto))
+# Secciones de objetivos, propuestas y estrategias
+_OBJECTIVE_KEYWORDS_RE = _keyword_pattern([
+    'objetivo general', 'objetivo específico', 'propósito', 'finalidad',
+    'estrategia', 'propone', 'establece', 'busca', 'pretende',
+    'medidas para', 'política nacional', 'objetivo principal',
+    'este documento conpes', 'la presente política', 'el objetivo de'
+])
+# Patrones específicos para CONPES, unidos en una sola expresión
+_CONPES_PATTERNS_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in [
+    r'el presente documento conpes.*objetivo.*',
+    r'política nacional.*objetivo.*',
+    r'establece medidas para.*',
+    r'tiene como objetivo.*',
+    r'busca.*mediante.*',
+    r'propone.*estrategia.*'
+]))
+_INTRO_SECTIONS_RE = _keyword_pattern(['resumen ejecutivo', 'introducción', 'justificación'])
+# Palabras clave técnicas para desarrolladores
+_DEV_HIGH_PRIORITY_RE = _keyword_pattern([
+    'sistema de información', 'aplicaciones', 'software', 'desarrollo tecnológico',
+    'plataformas digitales', 'infraestructura tecnológica', 'arquitectura de seguridad',
+    'implementación de medidas', 'controles de seguridad', 'gestión de riesgos'
+])
+_DEV_TECH_KEYWORDS_RE = _keyword_pattern([
+    'sistema', 'aplicación', 'software', 'desarrollo', 'tecnología', 'digital',
+    'infraestructura', 'ciberseguridad', 'datos', 'información', 'plataforma',
+    'implementación', 'arquitectura', 'seguridad', 'privacidad', 'protección',
+    'capacidades técnicas', 'estándares', 'framework', 'metodologías'
+])
+_DEV_PATTERNS_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in [
+    r'desarrollo.*sistema.*',
+    r'implementación.*tecnología.*',
+    r'capacidades.*técnicas.*',
+    r'estándares.*seguridad.*',
+    r'arquitectura.*información.*',
+    r'gestión.*riesgos.*digital.*'
+]))
+_OVERVIEW_KEYWORDS_RE = _keyword_pattern([
+    'resumen', 'antecedentes', 'introducción', 'contexto', 'justificación'
+])
+_SENSITIVE_MARKERS = ('datos sensibles', 'dato sensible')
+_SENSITIVE_MARKERS_RE = _keyword_pattern(_SENSITIVE_MARKERS)
+_SENSITIVE_STOP_RE = _keyword_pattern(['transferencia:', 'transmisión:', 'artículo', 'capítulo'])
+_IMPL_KEYWORDS = (
+    'implementar', 'cumplir', 'aplicar', 'ejecutar', 'desarrollar', 'establecer',
+    'medidas', 'acciones', 'procedimientos', 'requisitos', 'obligaciones',
+    'debe', 'deberá', 'se requiere', 'necesario'
+)
+_IMPL_KEYWORDS_RE = _keyword_pattern(_IMPL_KEYWORDS)
+_SKIP_PATTERNS = (
+    'decreto 1377 de 2013',
+    'reglamenta parcialmente la ley',
+    'considerando:',
+    'decreta:',
+    'el presidente de la república'
+)
+_SKIP_PATTERNS_RE = _keyword_pattern(_SKIP_PATTERNS)
+_DEFINITION_MARKERS = ('se entiende', 'definición', 'significa')
+_DEFINITION_MARKERS_RE = _keyword_pattern(_DEFINITION_MARKERS)
+_REQUIREMENT_MARKERS = ('debe', 'deberá', 'obligación', 'requisito')
+_REQUIREMENT_MARKERS_RE = _keyword_pattern(_REQUIREMENT_MARKERS)
+_STRUCTURE_MARKERS_RE = _keyword_pattern(['1.', '2.', 'a)', 'b)', '•'])
+# Términos que abren una ventana de contexto en los extractores de seguridad
+_RETENTION_TERMS_RE = _keyword_pattern(['limitaciones temporales', 'conservar', 'tiempo', 'supresión'])
+_SENSITIVE_HANDLING_TERMS_RE = _keyword_pattern(['tratamiento de datos sensibles', 'datos sensibles', 'autorización para'])
+_AUTHORIZATION_TERMS_RE = _keyword_pattern(['autorización', 'consentimiento', 'solicitar', 'obtener'])
+_POLICY_TERMS_RE = _keyword_pattern(['política', 'manual', 'procedimiento'])
+_SUBJECT_RIGHTS_TERMS_RE = _keyword_pattern(['habeas data', 'derecho'])
+_TRANSFER_TERMS_RE = _keyword_pattern(['transferencia', 'transmisión'])
+_MINORS_TERMS_RE = _keyword_pattern(['menores', 'niños', 'adolescentes', 'menor de edad'])
+_PRINCIPLE_TERMS_RE = _keyword_pattern(['principio'])
+_SECURITY_TERMS_RE = _keyword_pattern(['seguridad', 'protección', 'conservar', 'medidas', 'procedimientos', 'autorización'])
+
+# Prefiltros por tema sobre el contexto sin dividir: si ningún término aparece,
+# el extractor responde sin recorrer líneas
+_TOPIC_PREFILTER_RE = {
+    'retention': re.compile(_RETENTION_TERMS_RE.pattern, re.IGNORECASE),
+    'sensitive_handling': re.compile(_SENSITIVE_HANDLING_TERMS_RE.pattern, re.IGNORECASE),
+    'principles': re.compile(_PRINCIPLE_TERMS_RE.pattern, re.IGNORECASE),
+    'authorization': re.compile(_AUTHORIZATION_TERMS_RE.pattern, re.IGNORECASE),
+    'policy': re.compile(_POLICY_TERMS_RE.pattern, re.IGNORECASE),
+    'habeas_data': re.compile(_SUBJECT_RIGHTS_TERMS_RE.pattern, re.IGNORECASE),
+    'transfer': re.compile(_TRANSFER_TERMS_RE.pattern, re.IGNORECASE),
+    'minors': re.compile(_MINORS_TERMS_RE.pattern, re.IGNORECASE),
+}
+_TOPIC_NO_INFO = {
+    'retention': "No encontré información específica sobre conservación de datos en el documento.",
+    'sensitive_handling': "No encontré información específica sobre manejo de datos sensibles en el documento.",
+    'principles': "No encontré principios específicos de tratamiento en el documento consultado.",
+    'authorization': "No encontré información específica sobre obtención de autorización en el documento.",
+    'policy': "No encontré información específica sobre políticas de tratamiento en el documento.",
+    'habeas_data': "No encontré información específica sobre habeas data en el documento.",
+    'transfer': "No encontré información específica sobre transferencias internacionales en el documento.",
+    'minors': "No encontré información específica sobre tratamiento de datos de menores en el documento.",
+}
+
+# Condiciones secundarias sobre la línea candidata (un solo recorrido en lugar de varios 'in')
+_AUTHORIZATION_SUBJECT_RE = _keyword_pattern(['titular', 'tratamiento', 'datos'])
+_TRANSFER_SUBJECT_RE = _keyword_pattern(['datos', 'internacional'])
+_PRINCIPLE_NAMES_RE = _keyword_pattern(['seguridad', 'legalidad', 'finalidad', 'proporcionalidad'])
+
+# Palabras vacías en español
+_STOP_WORDS = frozenset({
+    'el', 'la', 'de', 'en', 'y', 'a', 'los', 'las', 'un', 'una', 'para', 'con',
+    'por', 'del', 'al', 'es', 'son', 'se', 'su', 'que', 'como', 'más', 'sobre',
+    'qué', 'cuál', 'cuáles', 'dice', 'establece', 'define', 'menciona'
+})
+
+# Términos legales importantes
+_LEGAL_TERMS = frozenset({
+    'artículo', 'ley', 'decreto', 'resolución', 'circular', 'capítulo',
+    'obligación', 'derecho', 'deber', 'requisito', 'procedimiento',
+    'sanción', 'infracción', 'responsable', 'titular', 'tratamiento'
+})
+
+# Términos técnicos importantes
+_TECH_TERMS = frozenset({
+    'datos', 'información', 'seguridad', 'protección', 'privacidad',
+    'autorización', 'consentimiento', 'transferencia', 'sensible',
+    'personal', 'confidencial', 'acceso', 'uso', 'finalidad'
+})
+
+# Tipos de consulta, en orden de prioridad
+_QTYPE_PATTERNS = (
+    ('definition', ('qué es', 'definición', 'concepto')),
+    ('requirement', ('obligación', 'debe', 'requisito')),
+    ('procedure', ('procedimiento', 'cómo', 'pasos')),
+    ('sanction', ('sanción', 'multa', 'penalidad')),
+)
+
+# Contexto específico por término definido
+_TERM_CONTEXT_INFO = {
+    'tratamiento': "**Alcance:** Incluye recolección, almacenamiento, uso, circulación o supresión de datos.",
+    'responsable': "**Rol:** Decide sobre la finalidad y el tratamiento de los datos personales.",
+    'titular': "**Limitación:** Solo personas naturales pueden ser titulares.",
+    'encargado': "**Función:** Realiza el tratamiento por cuenta del responsable."
+}
+
+# Bloques fijos de las respuestas de los extractores
+_SENSITIVE_DATA_IMPLICATIONS = (
+    "**Implicaciones importantes:**\n"
+    "• Requieren autorización explícita del titular\n"
+    "• El titular no está obligado a autorizar su tratamiento\n"
+    "• Se debe informar claramente que son datos sensibles\n"
+    "• Ninguna actividad puede condicionarse a su suministro\n"
+)
+_PRIVACY_NOTICE_FEATURES = (
+    "**Características del aviso de privacidad:**\n"
+    "• Es una comunicación verbal o escrita\n"
+    "• Informa sobre la existencia de políticas de tratamiento\n"
+    "• Indica cómo acceder a las políticas\n"
+    "• Describe las finalidades del tratamiento\n"
+)
+_RETENTION_PRINCIPLES = (
+    "**Principios clave:**\n"
+    "• Solo durante el tiempo razonable y necesario\n"
+    "• Según las finalidades que justificaron el tratamiento\n"
+    "• Cumplir obligaciones legales o contractuales\n"
+    "• Documentar procedimientos de conservación y supresión\n"
+)
+_SENSITIVE_HANDLING_REQUIREMENTS = (
+    "**Requisitos especiales:**\n"
+    "• Informar que no está obligado a autorizar\n"
+    "• Obtener consentimiento explícito\n"
+    "• Informar cuáles datos son sensibles\n"
+    "• No condicionar actividades a su suministro\n"
+)
+_ISO27001_RELATED_CONTROLS = (
+    "**📋 Controles ISO 27001 relacionados:**\n"
+    "• **A.18.1** - Cumplimiento de requisitos legales y contractuales\n"
+    "• **A.18.2** - Revisiones de seguridad de la información\n"
+    "• **A.13.2** - Transferencia de información\n"
+    "• **A.9.1** - Controles de acceso a la información\n\n"
+)
+_ISO27001_PRACTICE = (
+    "**🔒 Implementación práctica:**\n"
+    "• **Clasificación de datos**: Identificar datos personales como información sensible\n"
+    "• **Control de acceso**: Implementar autorización del titular como control\n"
+    "• **Retención**: Definir períodos según finalidad del tratamiento\n"
+    "• **Cifrado**: Proteger datos personales en tránsito y reposo\n"
+    "• **Auditoría**: Registrar accesos y modificaciones\n\n"
+)
+_ISO27001_DEFAULT_REQUIREMENTS = (
+    "• Garantizar condiciones de seguridad para impedir alteración\n"
+    "• Conservar información bajo condiciones apropiadas\n"
+    "• Implementar controles de acceso y autorización\n"
+)
+_PRINCIPLES_SECURITY_IMPLICATIONS = (
+    "**🔐 Implicaciones para seguridad de la información:**\n"
+    "• **Principio de legalidad**: Base legal para el procesamiento\n"
+    "• **Principio de finalidad**: Limitación del uso de datos\n"
+    "• **Principio de proporcionalidad**: Minimización de datos\n"
+    "• **Principio de seguridad**: Protección técnica y organizacional\n"
+)
+_SECURITY_CONNECTION_POINTS = (
+    "**🔗 Conexiones fundamentales:**\n\n"
+    "**1. Control de acceso y autorización:**\n"
+    "• La autorización del titular equivale a un control de acceso\n"
+    "• Los derechos ARCO (Acceso, Rectificación, Cancelación, Oposición) son controles de datos\n\n"
+    "**2. Clasificación y manejo de información:**\n"
+    "• Datos sensibles requieren controles adicionales de seguridad\n"
+    "• Datos públicos, semiprivados y privados tienen diferentes niveles de protección\n\n"
+    "**3. Controles técnicos y organizacionales:**\n"
+    "• Políticas de tratamiento = Políticas de seguridad de datos\n"
+    "• Medidas de seguridad para impedir alteración, pérdida o acceso no autorizado\n\n"
+    "**4. Auditoría y trazabilidad:**\n"
+    "• Registro de tratamientos y accesos\n"
+    "• Demostración de cumplimiento (accountability)\n\n"
+    "**5. Gestión de incidentes:**\n"
+    "• Notificación de violaciones de seguridad\n"
+    "• Procedimientos de respuesta ante incidentes\n\n"
+)
+_SECURITY_FOLLOWUP_QUESTIONS = (
+    "• ¿Cuáles son las obligaciones del responsable?\n"
+    "• ¿Qué medidas de seguridad se requieren?\n"
+    "• ¿Cómo manejar datos sensibles?\n"
+    "• ¿Qué hacer en caso de violación de datos?\n"
+)
+_AUTHORIZATION_SECURITY_CONTROLS = (
+    "**🔐 Controles de seguridad relacionados:**\n"
+    "• **Control de acceso**: La autorización del titular funciona como control de acceso\n"
+    "• **Gestión de identidades**: Verificar identidad del titular antes de procesar\n"
+    "• **Registro de actividades**: Documentar autorizaciones otorgadas\n"
+    "• **Revisión periódica**: Verificar vigencia de autorizaciones\n"
+)
+_POLICY_SECURITY_EQUIVALENCES = (
+    "**📋 Equivalencia con documentación de seguridad:**\n"
+    "• **Políticas de tratamiento** = Políticas de seguridad de datos\n"
+    "• **Procedimientos** = Procedimientos operativos estándar (SOP)\n"
+    "• **Manual interno** = Manual de seguridad de la información\n"
+    "• **Consultas y reclamos** = Gestión de incidentes de datos\n"
+)
+_ARCO_CONTROLS = (
+    "**🔐 Controles ARCO (Acceso, Rectificación, Cancelación, Oposición):**\n"
+    "• **Acceso**: Derecho a consultar qué datos se procesan\n"
+    "• **Rectificación**: Derecho a corregir datos inexactos\n"
+    "• **Cancelación**: Derecho a eliminar datos innecesarios\n"
+    "• **Oposición**: Derecho a objetar el procesamiento\n\n"
+)
+_SGSI_RIGHTS_IMPLEMENTATION = (
+    "**📋 Implementación en SGSI:**\n"
+    "• Procedimientos de atención de solicitudes\n"
+    "• Registros de acceso a datos personales\n"
+    "• Controles de modificación y eliminación\n"
+)
+_TRANSFER_CONTROLS = (
+    "**🌐 Controles de transferencia internacional:**\n"
+    "• **Evaluación de destino**: Verificar nivel de protección del país receptor\n"
+    "• **Contratos de transferencia**: Cláusulas contractuales de protección\n"
+    "• **Autorización previa**: Consentimiento del titular para transferencia\n"
+    "• **Registro de transferencias**: Documentar todas las transferencias realizadas\n"
+)
+_MINORS_CONTROLS = (
+    "**👶 Controles especiales para menores:**\n"
+    "• **Consentimiento parental**: Autorización del representante legal\n"
+    "• **Verificación de edad**: Controles para identificar menores\n"
+    "• **Interés superior**: Priorizar bienestar del menor\n"
+    "• **Limitaciones de uso**: Restricciones en el procesamiento\n"
+)
+
+# Cuerpo fijo de la respuesta de videovigilancia (solo el encabezado y la fuente varían)
+_VIDEO_RESPONSE_BODY = (
+    "**📹 Aplicación de principios de protección de datos:**\n\n"
+    "**1. Finalidad específica:**\n"
+    "• La videovigilancia debe tener una finalidad legítima definida\n"
+    "• Seguridad de personas, bienes o instalaciones\n\n"
+    "**2. Proporcionalidad:**\n"
+    "• Las cámaras solo deben capturar lo necesario\n"
+    "• Evitar espacios privados (baños, vestuarios)\n\n"
+    "**3. Información al titular:**\n"
+    "• Avisos visibles de videovigilancia\n"
+    "• Identificación del responsable del tratamiento\n\n"
+    "**4. Derechos del titular:**\n"
+    "• Derecho de acceso a las imágenes donde aparezca\n"
+    "• Derecho de supresión cuando no sean necesarias\n\n"
+    "**🔐 Controles técnicos recomendados:**\n"
+    "• **Cifrado** de grabaciones almacenadas\n"
+    "• **Control de acceso** a sistemas de videovigilancia\n"
+    "• **Registro de accesos** a las grabaciones\n"
+    "• **Retención limitada** según finalidad\n"
+)
+
+# Encabezados repetitivos que se eliminan del contenido mostrado
+_GENERIC_HEADERS = (
+    'Decreto 1377 de 2013',
+    'Ley 1581 de 2012',
+    'Reglamenta parcialmente',
+    'Por la cual se dictan disposiciones'
+)
+
+# Tabla para quitar tildes; conserva la longitud, así los desplazamientos coinciden
+# con los del texto original. También pliega comillas, guiones y viñetas tipográficas,
+# que de otro modo obligan a Python a guardar todo el texto con 2-4 bytes por carácter.
+_STRIP_ACCENTS = str.maketrans(
+    'áéíóúÁÉÍÓÚüÜ' '“”‘’ʻ' '‐‑–—' '•\uf0b7',
+    'aeiouAEIOUuU' '""\'\'\'' '----' '**'
+)
+# La misma tabla partida en dos: los pocos caracteres fuera de latin-1 se pliegan con
+# una regex y el resto (casi todo el texto) con bytes.translate, que usa una tabla de
+# 256 entradas en lugar de consultar un dict por cada carácter como str.translate
+_STRIP_ACCENTS_LATIN1 = bytes.maketrans(
+    bytes(key for key in _STRIP_ACCENTS if key < 256),
+    bytes(value for key, value in _STRIP_ACCENTS.items() if key < 256)
+)
+_WIDE_FOLDS = {chr(key): chr(value) for key, value in _STRIP_ACCENTS.items() if key > 255}
+_WIDE_FOLD_RE = re.compile('[' + ''.join(_WIDE_FOLDS) + ']')
+
+
+def _fold_accents(text: str) -> str:
+    """Equivale a text.translate(_STRIP_ACCENTS), unas diez veces más rápido en textos largos"""
+    if text.isascii():
+        return text
+    text = _WIDE_FOLD_RE.sub(lambda match: _WIDE_FOLDS[match.group()], text)
+    try:
+        raw = text.encode('latin-1')
+    except UnicodeEncodeError:
+        # Quedan caracteres sin equivalente en la tabla (p. ej. '€'): camino general
+        return text.translate(_STRIP_ACCENTS)
+    return raw.translate(_STRIP_ACCENTS_LATIN1).decode('latin-1')
+
+
+def _keyword_battery(groups, fold_accents: bool = True) -> Tuple[re.Pattern, Dict[str, Tuple[str, ...]]]:
+    """Unir varios grupos de palabras clave (por defecto sin tildes) en un solo patrón.
+    
+    Devuelve el patrón y, para cada literal, los grupos que dispara: los suyos y
+    los de todo literal más corto que sea su prefijo, ya que en una misma posición
+    la alternancia solo reporta el literal más largo.
+    """
+    literal_groups = {}
+    for name, keywords in groups:
+        for keyword in keywords:
+            literal = keyword.translate(_STRIP_ACCENTS) if fold_accents else keyword
+            literal_groups.setdefault(literal, set()).add(name)
+    
+    owners = {}
+    for literal in literal_groups:
+        names = set()
+        for other, other_names in literal_groups.items():
+            if literal.startswith(other):
+                names |= other_names
+        owners[literal] = tuple(sorted(names))
+    
+    return _keyword_pattern(list(literal_groups)), owners
+
+
+# Patrones de estructura de línea (se aplican sobre la línea normalizada sin tildes)
+_RE_ART_NUM = re.compile(r'^articulo\s+(\d+)')
+_CHAPTER_PREFIXES = ('capitulo', 'titulo', 'seccion')
+# Encabezado de artículo en la línea original; los adornos (°, º, .) no se validan:
+# basta con comparar el número completo capturado
+_RE_ARTICLE_HEADING = re.compile(r'artículo\s+(\d+)', re.IGNORECASE)
+
+
+def _iter_lines_indexed(text: str):
+    """Recorrer (índice, línea) sin construir la lista completa de líneas"""
+    start = 0
+    i = 0
+    n = len(text)
+    while start < n:
+        nl = text.find('\n', start)
+        end = n if nl < 0 else nl
+        yield i, text[start:end]
+        i += 1
+        start = end + 1
+
+
+def _is_letter_item(line: str, last: str = 'z') -> bool:
+    """Línea de lista tipo "a)" hasta la letra indicada, comparando caracteres sin regex"""
+    return len(line) >= 2 and 'a' <= line[0] <= last and line[1] == ')'
+
+
+# Vista preprocesada de un contexto: se calcula una vez y la comparten los extractores
+ParsedContext = namedtuple('ParsedContext', [
+    'lines',                # líneas originales
+    'lines_clean',          # líneas sin espacios extremos
+    'lines_lower',          # líneas limpias en minúsculas
+    'lines_norm',           # líneas en minúsculas sin tildes (misma longitud)
+    'article_indices',      # {número de artículo: [índices de línea del encabezado]}
+    'letter_list_indices',  # índices de líneas tipo "a)", "b)", ...
+    'section_types',        # tipo detectado por línea (article/chapter/definition/requirement/None)
+    'text_lower',           # lines_lower unidas con '\n'
+    'line_starts',          # desplazamiento de cada línea en text_lower (y en el texto normalizado)
+    'hits',                 # {escáner: [índices de líneas con coincidencia]}
+    'topic_index',          # {patrón de tema: (índices de línea,)} completado por _topic_lines
+])
+
+# Escáneres de palabras clave que se resuelven en el mismo procesamiento del contexto.
+# Todos los grupos se unen en una sola batería que recorre el texto completo una vez,
+# en lugar de probarse línea a línea en cada extractor. Se aplican sin tildes, para
+# documentos con o sin acentos.
+_LINE_SCANNERS = (
+    ('definition', _DEFINITION_MARKERS),
+    ('requirement', _REQUIREMENT_MARKERS),
+    ('skip', _SKIP_PATTERNS),
+    ('implementation', _IMPL_KEYWORDS),
+    ('sensitive', _SENSITIVE_MARKERS),
+)
+_LINE_BATTERY_RE, _LINE_BATTERY_GROUPS = _keyword_battery(_LINE_SCANNERS)
+
+# Máximo de contextos procesados que se mantienen en memoria
+_PARSED_CONTEXT_CACHE_SIZE = 8
+
+# Respuestas reutilizables para preguntas repetidas
+_RESPONSE_CACHE_SIZE = 512
+_RESPONSE_TTL = 3600  # segundos
+# Respuestas estructuradas: la clave lleva un digest del contexto (no el texto completo,
+# que puede sumar varios MB), así que cada entrada solo retiene la respuesta
+_STRUCTURED_CACHE_SIZE = 64
+
+# Textos normativos leídos de disco (inmutables; se releen pasado el TTL)
+_DOCUMENT_CACHE_SIZE = 32
+_DOCUMENT_TTL = 3600  # segundos
+
+# Patrones precompilados de los extractores
+_WS_RE = re.compile(r'\s+')
+_CONTEXT_MARKER_RE = re.compile(r'^---.*?---\s*')
+_ARTICLE_END_RE = re.compile(r'(CAPÍTULO|TÍTULO|Parágrafo)', re.IGNORECASE)
+# Con MULTILINE, el antiguo '.*?(?=\n\d+\.|$)' se detenía siempre en el primer fin
+# de línea: equivale a tomar el resto de la línea, sin retroceso carácter a carácter
+_PRIVACY_DEF_RE = re.compile(r'(Aviso de privacidad:[^\n]*)', re.IGNORECASE)
+# Definiciones básicas de la Ley 1581 (Artículo 3)
+_TERM_DEFINITION_RES = {
+    term: re.compile(pattern, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+    for term, pattern in {
+        'tratamiento': r'g\)\s*Tratamiento:\s*(.*?)(?=\n[a-z]\)|TÍTULO|$)',
+        'responsable': r'e\)\s*Responsable del Tratamiento:\s*(.*?)(?=\nf\)|TÍTULO|$)',
+        'titular': r'f\)\s*Titular:\s*(.*?)(?=\ng\)|TÍTULO|$)',
+        'encargado': r'd\)\s*Encargado del Tratamiento:\s*(.*?)(?=\ne\)|TÍTULO|$)'
+    }.items()
+}
+# Referencias normativas para el modo sin IA
+_ARTICLE_REF_RES = tuple(re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'artículo\s+\d+°*',
+    r'capítulo\s+[ivxlc]+',
+    r'numeral\s+\d+',
+    r'literal\s+[a-z]\)'
+])
+_RE_ARTICLE_MENTION = re.compile(r'artículo\s+(\d+)')
+# Marcadores que amplían una cita textual a su contexto
+_CITATION_MARKERS_RE = _keyword_pattern(['artículo', 'definición', 'establece', 'dispone'])
+# Señales de documentos ajenos a la consulta en la validación de relevancia
+_PERSONAL_DATA_CONTENT_RE = _keyword_pattern(['datos personales', 'protección', 'tratamiento'])
+_SECTORAL_CONTENT_RE = _keyword_pattern(['sector trabajo', 'sector comercio'])
+_SECURITY_CONTENT_RE = _keyword_pattern(['seguridad', 'información', 'gestión', 'iso'])
+
+
+def _bounded_put(cache: Dict, key: Any, value: Any, limit: int = _PARSED_CONTEXT_CACHE_SIZE) -> None:
+    """Guardar en una cache de tamaño máximo, descartando la entrada más antigua"""
+    if len(cache) >= limit:
+        cache.pop(next(iter(cache)))
+    cache[key] = value
+
+
+def _squeeze_head(text: str, limit: int) -> str:
+    """Primeros `limit` caracteres de text con los espacios colapsados.
+    
+    Colapsar un prefijo da un prefijo del texto colapsado completo, así que basta con
+    normalizar un tramo algo mayor que el límite; solo si los espacios consumen ese
+    margen se recurre al texto entero.
+    """
+    window = limit + 100
+    head = _WS_RE.sub(' ', text[:window])
+    if len(head) < limit and len(text) > window:
+        head = _WS_RE.sub(' ', text)
+    return head[:limit]
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia de un resultado cacheado (quien llama puede modificar response o sources)"""
+    result = dict(result)
+    if 'sources' in result:
+        result['sources'] = list(result['sources'])
+    return result
+
+
+@lru_cache(maxsize=4096)
+def _normalize_citation(text: str) -> str:
+    """Colapsar espacios de una cita; las mismas citas se repiten entre consultas"""
+    return _WS_RE.sub(' ', text)
+
+
+def _topic_lines(parsed: ParsedContext, pattern: re.Pattern):
+    """Índices de línea (en orden, sin repetir) donde aparece algún término del patrón.
+    
+    Recorre text_lower con finditer de forma perezosa: si el extractor se detiene
+    en la primera ventana útil, el resto del documento no se escanea. Un recorrido
+    completo queda guardado en parsed.topic_index, de modo que los demás extractores
+    que consulten el mismo tema sobre el mismo contexto no vuelven a escanearlo.
+    """
+    cached = parsed.topic_index.get(pattern)
+    if cached is not None:
+        yield from cached
+        return
+    found = []
+    for match in pattern.finditer(parsed.text_lower):
+        idx = bisect_right(parsed.line_starts, match.start()) - 1
+        if not found or found[-1] != idx:
+            found.append(idx)
+            yield idx
+    parsed.topic_index[pattern] = tuple(found)
+
+
+# Resultado inmutable del análisis de una consulta (seguro para cachear)
+QueryAnalysis = namedtuple('QueryAnalysis', [
+    'terms',            # ((término, peso), ...) en orden de aparición
+    'terms_re',         # alternancia con todos los términos, o None
+    'term_owners',      # literal encontrado -> términos que cuentan en esa posición
+    'has_article_ref',
+    'has_number',
+    'query_type',
+])
+
+
+@lru_cache(maxsize=128)
+def _determine_query_type(query: str) -> str:
+    """Determinar el tipo de consulta para mejor procesamiento"""
+    query_lower = query.lower()
+    
+    for query_type, markers in _QTYPE_PATTERNS:
+        if any(q in query_lower for q in markers):
+            return query_type
+    return 'general'
+
+
+@lru_cache(maxsize=128)
+def _analyze_query_semantics(query: str) -> QueryAnalysis:
+    """Analizar semánticamente la consulta para extraer términos con pesos"""
+    words = query.split()
+    terms = {}
+    
+    for word in words:
+        word_clean = word.lower().strip('.,;:?¿!¡')
+        
+        if word_clean in _STOP_WORDS or len(word_clean) < 3:
+            continue
+        
+        # Asignar pesos según tipo
+        if word_clean in _LEGAL_TERMS:
+            terms[word_clean] = 3  # Alta prioridad
+        elif word_clean in _TECH_TERMS:
+            terms[word_clean] = 2  # Media prioridad
+        else:
+            terms[word_clean] = 1  # Prioridad normal
+    
+    # Una sola alternancia con todos los términos: un recorrido por sección. Cada término
+    # es su propio grupo, así un término que es prefijo de otro ('dato' en 'datos') también cuenta
+    terms_re, term_owners = (_keyword_battery([(term, (term,)) for term in terms], fold_accents=False)
+                             if terms else (None, {}))
+    return QueryAnalysis(
+        terms=tuple(terms.items()),
+        terms_re=terms_re,
+        term_owners=term_owners,
+        has_article_ref=any('artículo' in w.lower() for w in words),
+        has_number=any(w.isdigit() for w in words),
+        query_type=_determine_query_type(query),
+    )
+
+
+# Temas de la consulta que deciden el flujo de respuesta, detectados con una sola
+# batería sobre la consulta en minúsculas
+_QUERY_TOPICS = (
+    # Temas fundamentales: se responden sin validación previa de relevancia
+    ('fundamental', ('obligaciones', 'derechos', 'qué es', 'definición', 'tratamiento',
+                     'responsable', 'titular', 'encargado', 'datos sensibles', 'aviso', 'privacidad')),
+    # Despacho de _extract_security_relevant_info
+    ('iso27001', ('iso', '27001', 'seguridad información', 'implementar')),
+    ('principles', ('principios',)),
+    ('authorization', ('autorización',)),
+    ('policy', ('política', 'procedimiento', 'manual')),
+    ('habeas_data', ('habeas data',)),
+    ('transfer', ('transferir', 'transmisión', 'país', 'internacional')),
+    ('minors', ('menores', 'niños', 'adolescentes')),
+    ('surveillance', ('videovigilancia',)),
+)
+_QUERY_TOPICS_RE, _QUERY_TOPIC_GROUPS = _keyword_battery(_QUERY_TOPICS, fold_accents=False)
+
+
+@lru_cache(maxsize=128)
+def _query_topics(query_lower: str) -> frozenset:
+    """Temas presentes en la consulta, en un solo recorrido (incluye términos solapados)"""
+    topics = set()
+    search = _QUERY_TOPICS_RE.search
+    match = search(query_lower)
+    while match:
+        topics.update(_QUERY_TOPIC_GROUPS[match.group()])
+        match = search(query_lower, match.start() + 1)
+    return frozenset(topics)
+
+
+# Temas de seguridad con extractor propio, en orden de prioridad
+_SECURITY_TOPIC_PRIORITY = (
+    'iso27001',      # conexiones específicas con seguridad de la información
+    'principles',    # principios de tratamiento (controles de seguridad)
+    'authorization', # autorización (control de acceso)
+    'policy',        # políticas de tratamiento (documentación de seguridad)
+    'habeas_data',   # derecho de acceso y rectificación
+    'transfer',      # transferencias internacionales
+    'minors',        # menores de edad (datos especiales)
+    'surveillance',  # videovigilancia (monitoreo y control)
+)
+
+
+@lru_cache(maxsize=128)
+def _security_topic(topics: frozenset) -> Optional[str]:
+    """Tema de seguridad de mayor prioridad presente en la consulta, o None"""
+    for topic in _SECURITY_TOPIC_PRIORITY:
+        if topic in topics:
+            return topic
+    return None
+
+
+@lru_cache(maxsize=128)
+def _query_terms_pattern(query_terms: Tuple[str, ...]) -> re.Pattern:
+    """Alternancia compilada con los términos de la consulta (un recorrido por texto)"""
+    return _keyword_pattern(query_terms)
+
+
 class ChatbotLegal:
     def __init__(self, api_key: str = None, db_path: str = None, texts_path: str = None):
         """
@@ -56,6 +686,31 @@ class ChatbotLegal:
             os.path.dirname(__file__), '..', 'data_repository', 'textos_limpios_seguro'
         )
         
+        # Cache de contextos ya divididos y clasificados (clave: texto del contexto)
+        self._parsed_contexts = {}
+        # Cache de citas textuales: (contexto, términos de la consulta) -> citas
+        self._textual_citations = {}
+        # Camino directo del modo básico: consulta exacta -> (timestamp, resultado exitoso)
+        self._direct_responses = {}
+        # Cache de respuestas estructuradas: (consulta, fuentes, digest del contexto) -> (timestamp, respuesta)
+        self._structured_responses = {}
+        # Cache de textos por documento: nombre_archivo -> (timestamp, contenido). Devolver
+        # siempre el mismo objeto hace que las caches por contexto acierten sin recomparar
+        self._document_contents = {}
+        # Contextos de consultas generales: (encabezado, documento, límite)... -> (textos, contexto)
+        self._general_contexts = {}
+        # Extractor por tema de seguridad (la prioridad la fija _SECURITY_TOPIC_PRIORITY)
+        self._security_handlers = {
+            'iso27001': self._extract_iso27001_connections,
+            'principles': self._extract_data_principles_for_security,
+            'authorization': self._extract_authorization_controls,
+            'policy': self._extract_policy_requirements,
+            'habeas_data': self._extract_data_subject_rights,
+            'transfer': self._extract_transfer_controls,
+            'minors': self._extract_minors_data_protection,
+            'surveillance': self._extract_surveillance_requirements,
+        }
+        
         # Sistema de prompts avanzados con ejemplos y validación estricta
         self.system_context = """Eres un asistente legal especializado EXCLUSIVAMENTE en normativa colombiana. Tu función es ser PRECISO, FACTUAL y RESTRICTIVO.
 
@@ -252,6 +907,11 @@ FORMATO OBLIGATORIO:
         """
         Obtener contenido completo de un documento
         """
+        cached = self._document_contents.get(document_id)
+        now = time.time()
+        if cached is not None and now - cached[0] < _DOCUMENT_TTL:
+            return cached[1]
+        
         # Buscar en todas las carpetas
         folders = ['leyes', 'decretos', 'resoluciones', 'circulares', 'conpes', 'otros']
         
@@ -260,10 +920,13 @@ FORMATO OBLIGATORIO:
             if os.path.exists(file_path):
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        return f.read()
+                        content = f.read()
                 except Exception as e:
                     print(f"Error reading {file_path}: {e}")
                     continue
+                self._document_contents.pop(document_id, None)
+                _bounded_put(self._document_contents, document_id, (now, content), _DOCUMENT_CACHE_SIZE)
+                return content
         
         return None
     
@@ -271,23 +934,24 @@ FORMATO OBLIGATORIO:
         """
         Extraer un artículo específico del contenido
         """
-        lines = content.split('\n')
         article_lines = []
         in_article = False
         article_started = False
         
-        for i, line in enumerate(lines):
+        # Recorrido perezoso: al cerrar el artículo se deja de leer el documento
+        for i, line in _iter_lines_indexed(content):
             line = line.strip()
             
-            # Buscar el artículo específico
-            if re.match(rf'Artículo\s+{article_number}[°º]?\.?\s*', line, re.IGNORECASE):
+            # Buscar el artículo específico (número exacto: el 17 no coincide con el 170)
+            heading = _RE_ARTICLE_HEADING.match(line)
+            if heading and heading.group(1) == article_number:
                 in_article = True
                 article_started = True
                 article_lines.append(line)
                 continue
             
             # Si encontramos otro artículo, terminar
-            if article_started and re.match(r'Artículo\s+\d+[°º]?\.?\s*', line, re.IGNORECASE):
+            if article_started and heading:
                 break
             
             # Si estamos en el artículo, agregar las líneas
@@ -295,7 +959,7 @@ FORMATO OBLIGATORIO:
                 if line:  # Solo líneas no vacías
                     article_lines.append(line)
                 # Detener si encontramos una sección nueva o parágrafo
-                if re.match(r'(CAPÍTULO|TÍTULO|Parágrafo)', line, re.IGNORECASE):
+                if _ARTICLE_END_RE.match(line):
                     break
                 # Limitar a 50 líneas por artículo (artículos muy largos)
                 if len(article_lines) > 50:
@@ -304,7 +968,7 @@ FORMATO OBLIGATORIO:
         if article_lines:
             full_text = ' '.join(article_lines)
             # Limpiar texto excesivo
-            full_text = re.sub(r'\s+', ' ', full_text)
+            full_text = _WS_RE.sub(' ', full_text)
             return full_text  # Sin límite - mostrar artículo completo
         
         return None
@@ -352,7 +1016,7 @@ FORMATO OBLIGATORIO:
                     }
         
         # Si solo menciona un artículo sin especificar documento
-        simple_article_match = re.search(r'artículo\s+(\d+)', query_lower)
+        simple_article_match = _RE_ARTICLE_MENTION.search(query_lower)
         if simple_article_match:
             # Intentar inferir el documento del contexto
             if '1581' in query_lower:
@@ -409,15 +1073,29 @@ FORMATO OBLIGATORIO:
                     'sources': []
                 }
             
+            # Camino directo: sin IA la respuesta solo depende de la consulta y de documentos
+            # inmutables, así que una consulta ya resuelta no vuelve a pasar por los extractores
+            direct = not self.ai_available
+            if direct:
+                cached = self._direct_responses.get(user_query)
+                if cached is not None and time.time() - cached[0] < _RESPONSE_TTL:
+                    return _copy_result(cached[1])
+            
             # Identificar intención
             intent = self.identify_query_intent(user_query)
             
             if intent['type'] == 'specific_article':
-                return self._handle_specific_article(intent, user_query)
+                result = self._handle_specific_article(intent, user_query)
             elif intent['type'] == 'specific_document':
-                return self._handle_specific_document(intent, user_query)
+                result = self._handle_specific_document(intent, user_query)
             else:
-                return self._handle_general_query(user_query)
+                result = self._handle_general_query(user_query)
+            
+            if direct and result.get('success'):
+                self._direct_responses.pop(user_query, None)
+                _bounded_put(self._direct_responses, user_query, (time.time(), _copy_result(result)),
+                             _RESPONSE_CACHE_SIZE)
+            return result
                 
         except Exception as e:
             return {
@@ -475,8 +1153,7 @@ FORMATO OBLIGATORIO:
                 query = msg.get('content', '').lower()
                 
                 # Detectar artículos mencionados
-                import re
-                articles = re.findall(r'artículo\s+(\d+)', query)
+                articles = _RE_ARTICLE_MENTION.findall(query)
                 context['previous_articles'].extend(articles)
                 
                 # Detectar conceptos clave
@@ -667,7 +1344,7 @@ FORMATO OBLIGATORIO:
             prioritized_docs = relevant_docs
         
         # Obtener contenido de documentos relevantes (priorizar los primeros)
-        context_content = ""
+        included = []
         sources = []
         
         for doc in prioritized_docs[:3]:  # Máximo 3 documentos
@@ -695,13 +1372,16 @@ FORMATO OBLIGATORIO:
                 
                 if needs_full_document:
                     # Usar documento completo para extracciones precisas
-                    context_content += f"\n\n--- {doc['tipo_norma']} {doc['numero']} de {doc['año']} ---\n{content}"
+                    limit = None
                 elif 'conpes' in doc.get('tipo_norma', '').lower():
-                    context_content += f"\n\n--- {doc['tipo_norma']} {doc['numero']} de {doc['año']} ---\n{content[:8000]}"
+                    limit = 8000
                 else:
-                    context_content += f"\n\n--- {doc['tipo_norma']} {doc['numero']} de {doc['año']} ---\n{content[:5000]}"
+                    limit = 5000
+                included.append((doc, content, limit))
                 sources.append(doc['nombre_archivo'])
         
+        context_content = self._general_context(included)
+        
         if not context_content:
             return {
                 'success': False,
@@ -711,6 +1391,26 @@ FORMATO OBLIGATORIO:
         
         return self._query_with_groq(user_query, context_content, prioritized_docs)
     
+    def _general_context(self, included: List[Tuple[Dict, str, Optional[int]]]) -> str:
+        """
+        Contexto concatenado de (documento, contenido, límite). Mientras los textos sean los
+        mismos objetos de _document_contents se devuelve el mismo string, así las caches por
+        contexto (_parsed_contexts, citas) aciertan también en las consultas generales
+        """
+        key = tuple((f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}", doc['nombre_archivo'], limit)
+                    for doc, _, limit in included)
+        cached = self._general_contexts.get(key)
+        if cached is not None and all(a is b for a, (_, b, _) in zip(cached[0], included)):
+            return cached[1]
+        
+        context = ''.join(
+            f"\n\n--- {header} ---\n{content if limit is None else content[:limit]}"
+            for (header, _, limit), (_, content, _) in zip(key, included)
+        )
+        self._general_contexts.pop(key, None)
+        _bounded_put(self._general_contexts, key, (tuple(content for _, content, _ in included), context))
+        return context
+    
     def _query_with_groq(self, user_query: str, context: str, sources: List[Dict]) -> Dict[str, Any]:
         """
         ARQUITECTURA HÍBRIDA: Groq extrae → Qwen genera respuesta
@@ -912,29 +1612,39 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
     
     def _extract_articles_fallback(self, context: str) -> List[str]:
         """Extraer artículos sin AI"""
-        import re
         articles = []
         
         # Buscar patrones de artículos
-        patterns = [
-            r'artículo\s+\d+°*',
-            r'capítulo\s+[ivxlc]+',
-            r'numeral\s+\d+',
-            r'literal\s+[a-z]\)'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, context, re.IGNORECASE)
+        for pattern in _ARTICLE_REF_RES:
+            matches = pattern.findall(context)
             articles.extend(matches[:5])  # Máximo 5 por patrón
         
         return list(set(articles))[:15]  # Máximo 15 artículos únicos
 
     def _generate_structured_response(self, user_query: str, context: str, sources: List[Dict]) -> str:
         """
-        Generar respuesta estructurada basada en el tipo de consulta
+        Generar respuesta estructurada basada en el tipo de consulta (con cache por consulta y fuentes)
         """
         query_lower = user_query.lower()
-        
+        key = (
+            query_lower.strip(),
+            tuple(doc.get('nombre_archivo') for doc in sources),
+            len(context),
+            hashlib.blake2b(context.encode('utf-8'), digest_size=16).digest()
+        )
+        cached = self._structured_responses.get(key)
+        now = time.time()
+        if cached is not None and now - cached[0] < _RESPONSE_TTL:
+            return cached[1]
+        
+        response = self._build_structured_response(user_query, query_lower, context, sources)
+        self._structured_responses.pop(key, None)
+        _bounded_put(self._structured_responses, key, (now, response), _STRUCTURED_CACHE_SIZE)
+        return response
+    
+    def _build_structured_response(self, user_query: str, query_lower: str, context: str,
+                                   sources: List[Dict]) -> str:
+        """Elegir el extractor según el tipo de consulta"""
         # Detectar tipo de consulta específica - MEJORADO con más casos específicos
         # Primero verificar temas muy específicos
         if any(term in query_lower for term in ['datos sensibles', 'dato sensible', 'información sensible']):
@@ -968,64 +1678,117 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         elif any(word in query_lower for word in ['implementar', 'cumplir', 'aplicar', 'medidas']) and 'iso' not in query_lower:
             return self._extract_implementation_guidance(context, sources[0] if sources else None)
         else:
-            return self._extract_security_relevant_info(user_query, context, sources)
+            return self._extract_security_relevant_info(user_query, context, sources, query_lower)
 
-    def _extract_objectives_and_proposals(self, context: str, doc: Dict) -> str:
-        """Extraer objetivos y propuestas del documento"""
+    def _parse_context(self, context: str) -> ParsedContext:
+        """Dividir y clasificar el contexto una sola vez para todos los extractores"""
+        parsed = self._parsed_contexts.get(context)
+        if parsed is not None:
+            return parsed
+        
         lines = context.split('\n')
-        relevant_sections = []
+        lines_clean = [line.strip() for line in lines]
+        lines_lower = [line.lower() for line in lines_clean]
+        article_indices = {}
+        letter_list_indices = []
+        section_types = []
+        
+        # Un solo recorrido de la batería sobre el texto completo; cada coincidencia
+        # se asigna a su línea con bisect sobre los desplazamientos de inicio
+        line_starts = []
+        offset = 0
+        for line_lower in lines_lower:
+            line_starts.append(offset)
+            offset += len(line_lower) + 1
+        text_lower = '\n'.join(lines_lower)
+        # Sin tildes en una sola pasada sobre el texto completo (la tabla conserva
+        # longitudes y no toca '\n', así que las líneas se recuperan con split)
+        text_norm = _fold_accents(text_lower)
+        lines_norm = text_norm.split('\n')
+        if not text_norm.isascii():
+            # Sustituir lo que quede fuera de latin-1 mantiene el texto escaneado en
+            # 1 byte por carácter sin alterar los desplazamientos
+            text_norm = text_norm.encode('latin-1', 'replace').decode('latin-1')
+        hits = {name: [] for name, _ in _LINE_SCANNERS}
+        # search desde la posición siguiente (no finditer) para ver también los
+        # literales que se solapan con la coincidencia anterior
+        search = _LINE_BATTERY_RE.search
+        match = search(text_norm)
+        while match:
+            start = match.start()
+            idx = bisect_right(line_starts, start) - 1
+            for name in _LINE_BATTERY_GROUPS[match.group()]:
+                line_idxs = hits[name]
+                if not line_idxs or line_idxs[-1] != idx:
+                    line_idxs.append(idx)
+            match = search(text_norm, start + 1)
+        # Los marcadores de estructura incluyen viñetas que la normalización pliega,
+        # por eso se buscan sobre el texto en minúsculas
+        structure_lines = []
+        for match in _STRUCTURE_MARKERS_RE.finditer(text_lower):
+            idx = bisect_right(line_starts, match.start()) - 1
+            if not structure_lines or structure_lines[-1] != idx:
+                structure_lines.append(idx)
+        hits['structure'] = structure_lines
+        definition_lines = set(hits['definition'])
+        requirement_lines = set(hits['requirement'])
+        
+        for i, line_norm in enumerate(lines_norm):
+            section_type = None
+            # El prefijo se verifica con startswith; la regex solo extrae el número
+            article_match = line_norm.startswith('articulo') and _RE_ART_NUM.match(line_norm)
+            if article_match:
+                article_indices.setdefault(int(article_match.group(1)), []).append(i)
+                section_type = 'article'
+            elif line_norm.startswith(_CHAPTER_PREFIXES):
+                section_type = 'chapter'
+            elif i in definition_lines:
+                section_type = 'definition'
+            elif i in requirement_lines:
+                section_type = 'requirement'
+            section_types.append(section_type)
+            
+            if _is_letter_item(line_norm):
+                letter_list_indices.append(i)
         
-        # Buscar secciones de objetivos, propuestas, estrategias con mayor precisión
-        objective_keywords = [
-            'objetivo general', 'objetivo específico', 'propósito', 'finalidad', 
-            'estrategia', 'propone', 'establece', 'busca', 'pretende', 
-            'medidas para', 'política nacional', 'objetivo principal',
-            'este documento conpes', 'la presente política', 'el objetivo de'
-        ]
+        parsed = ParsedContext(lines, lines_clean, lines_lower, lines_norm, article_indices,
+                               letter_list_indices, section_types, text_lower, line_starts, hits, {})
         
-        # También buscar patrones específicos para CONPES
-        conpes_patterns = [
-            r'el presente documento conpes.*objetivo.*',
-            r'política nacional.*objetivo.*',
-            r'establece medidas para.*',
-            r'tiene como objetivo.*',
-            r'busca.*mediante.*',
-            r'propone.*estrategia.*'
-        ]
+        _bounded_put(self._parsed_contexts, context, parsed)
+        return parsed
+
+    def _extract_objectives_and_proposals(self, context: str, doc: Dict) -> str:
+        """Extraer objetivos y propuestas del documento"""
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
+        relevant_sections = []
         
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            line_lower = line_clean.lower()
-            
+        for i, line_lower in enumerate(parsed.lines_lower):
             # Verificar keywords
-            has_keyword = any(keyword in line_lower for keyword in objective_keywords)
+            has_keyword = _OBJECTIVE_KEYWORDS_RE.search(line_lower)
             
             # Verificar patrones específicos
-            has_pattern = any(re.search(pattern, line_lower) for pattern in conpes_patterns)
+            has_pattern = _CONPES_PATTERNS_RE.search(line_lower)
             
             if has_keyword or has_pattern:
                 # Extraer contexto más amplio para objetivos principales
                 start = max(0, i-3)
                 end = min(len(lines), i+12)
-                section = []
-                for j in range(start, end):
-                    line_text = lines[j].strip()
-                    if line_text and len(line_text) > 10:  # Evitar líneas muy cortas
-                        section.append(line_text)
+                # Evitar líneas muy cortas
+                section = [line_text for line_text in lines[start:end] if line_text and len(line_text) > 10]
                 
                 if section and len(' '.join(section)) > 100:
                     relevant_sections.append(' '.join(section))
         
         # Buscar también en secciones de introducción y resumen ejecutivo
-        for i, line in enumerate(lines[:100]):  # Primeras 100 líneas
-            line_lower = line.strip().lower()
-            if any(section_name in line_lower for section_name in ['resumen ejecutivo', 'introducción', 'justificación']):
+        for i, line_lower in enumerate(parsed.lines_lower[:100]):  # Primeras 100 líneas
+            if _INTRO_SECTIONS_RE.search(line_lower):
                 start = i
                 end = min(len(lines), i+20)
                 section = []
                 for j in range(start, end):
-                    line_text = lines[j].strip()
-                    if line_text and not line_text.lower().startswith(('tabla', 'figura', 'gráfico')):
+                    line_text = lines[j]
+                    if line_text and not parsed.lines_lower[j].startswith(('tabla', 'figura', 'gráfico')):
                         section.append(line_text)
                         if len(section) > 15:  # Limitar tamaño
                             break
@@ -1036,7 +1799,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if relevant_sections:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "el documento"
             
-            response = f"**Objetivos y propuestas principales de {doc_name}:**\n\n"
+            parts = [f"**Objetivos y propuestas principales de {doc_name}:**\n\n"]
             
             # Remover duplicados similares
             unique_sections = []
@@ -1052,7 +1815,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
             
             for i, section in enumerate(unique_sections[:4], 1):
                 # Limpiar texto
-                section = re.sub(r'\s+', ' ', section)
+                section = _WS_RE.sub(' ', section)
                 # Extraer la parte más relevante
                 if len(section) > 5000:
                     # Buscar la oración más importante
@@ -1067,59 +1830,29 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                     else:
                         section = section[:5000] + "..."
                 
-                response += f"**{i}.** {section}\n\n"
+                parts.append(f"**{i}.** {section}\n\n")
             
-            return response
+            return ''.join(parts)
         
         return self._extract_general_relevant_info("objetivos propuestas", context, [doc] if doc else [])
 
     def _extract_developer_relevant_info(self, context: str, doc: Dict) -> str:
         """Extraer información relevante para desarrolladores con mayor precisión"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         relevant_sections = []
         
-        # Palabras clave técnicas más específicas para desarrollo
-        high_priority_keywords = [
-            'sistema de información', 'aplicaciones', 'software', 'desarrollo tecnológico',
-            'plataformas digitales', 'infraestructura tecnológica', 'arquitectura de seguridad',
-            'implementación de medidas', 'controles de seguridad', 'gestión de riesgos'
-        ]
-        
-        tech_keywords = [
-            'sistema', 'aplicación', 'software', 'desarrollo', 'tecnología', 'digital',
-            'infraestructura', 'ciberseguridad', 'datos', 'información', 'plataforma',
-            'implementación', 'arquitectura', 'seguridad', 'privacidad', 'protección',
-            'capacidades técnicas', 'estándares', 'framework', 'metodologías'
-        ]
-        
-        # Patrones específicos para desarrolladores
-        dev_patterns = [
-            r'desarrollo.*sistema.*',
-            r'implementación.*tecnología.*',
-            r'capacidades.*técnicas.*',
-            r'estándares.*seguridad.*',
-            r'arquitectura.*información.*',
-            r'gestión.*riesgos.*digital.*'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            line_lower = line_clean.lower()
-            
+        for i, line_lower in enumerate(parsed.lines_lower):
             # Priorizar keywords de alta relevancia
-            has_high_priority = any(keyword in line_lower for keyword in high_priority_keywords)
-            has_tech_keyword = any(keyword in line_lower for keyword in tech_keywords)
-            has_dev_pattern = any(re.search(pattern, line_lower) for pattern in dev_patterns)
+            has_high_priority = bool(_DEV_HIGH_PRIORITY_RE.search(line_lower))
+            has_tech_keyword = _DEV_TECH_KEYWORDS_RE.search(line_lower)
+            has_dev_pattern = _DEV_PATTERNS_RE.search(line_lower)
             
             if has_high_priority or has_tech_keyword or has_dev_pattern:
                 # Extraer contexto técnico más amplio
                 start = max(0, i-2)
                 end = min(len(lines), i+8)
-                section = []
-                for j in range(start, end):
-                    line_text = lines[j].strip()
-                    if line_text and len(line_text) > 15:
-                        section.append(line_text)
+                section = [line_text for line_text in lines[start:end] if line_text and len(line_text) > 15]
                 
                 if section:
                     section_text = ' '.join(section)
@@ -1131,7 +1864,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if relevant_sections:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "el documento"
             
-            response = f"**Relevancia de {doc_name} para desarrolladores de software:**\n\n"
+            parts = [f"**Relevancia de {doc_name} para desarrolladores de software:**\n\n"]
             
             # Ordenar por prioridad y remover duplicados
             relevant_sections.sort(key=lambda x: x[1], reverse=True)
@@ -1149,7 +1882,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
             
             # Mostrar las secciones más relevantes
             for i, (section, priority) in enumerate(unique_sections[:4], 1):
-                section = re.sub(r'\s+', ' ', section)
+                section = _WS_RE.sub(' ', section)
                 
                 # Extraer las oraciones más técnicamente relevantes
                 if len(section) > 3000:
@@ -1165,54 +1898,61 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                         section = section[:3000] + "..."
                 
                 priority_indicator = "🔥 " if priority > 1 else ""
-                response += f"**{priority_indicator}{i}.** {section}\n\n"
+                parts.append(f"**{priority_indicator}{i}.** {section}\n\n")
             
             # Agregar implicaciones técnicas específicas basadas en el contenido
-            response += "\n**💻 Implicaciones técnicas específicas para desarrolladores:**\n\n"
+            parts.append("\n**💻 Implicaciones técnicas específicas para desarrolladores:**\n\n")
             
             # Analizar el contenido para dar recomendaciones específicas
             context_lower = context.lower()
             if 'conpes' in context_lower and 'seguridad digital' in context_lower:
-                response += "**Seguridad Digital (CONPES 3995):**\n"
-                response += "• Implementar controles de ciberseguridad robustos desde el diseño\n"
-                response += "• Adoptar frameworks de gestión de riesgos digitales\n"
-                response += "• Cumplir con estándares nacionales de confianza digital\n"
-                response += "• Desarrollar capacidades de detección y respuesta a incidentes\n\n"
+                parts.append(
+                    "**Seguridad Digital (CONPES 3995):**\n"
+                    "• Implementar controles de ciberseguridad robustos desde el diseño\n"
+                    "• Adoptar frameworks de gestión de riesgos digitales\n"
+                    "• Cumplir con estándares nacionales de confianza digital\n"
+                    "• Desarrollar capacidades de detección y respuesta a incidentes\n\n"
+                )
             
             if 'datos' in context_lower or 'información' in context_lower:
-                response += "**Protección de Datos e Información:**\n"
-                response += "• Aplicar principios de Privacy by Design y Security by Design\n"
-                response += "• Implementar cifrado y controles de acceso apropiados\n"
-                response += "• Documentar y auditar medidas de protección de datos\n"
-                response += "• Establecer procedimientos de respuesta a brechas de seguridad\n\n"
+                parts.append(
+                    "**Protección de Datos e Información:**\n"
+                    "• Aplicar principios de Privacy by Design y Security by Design\n"
+                    "• Implementar cifrado y controles de acceso apropiados\n"
+                    "• Documentar y auditar medidas de protección de datos\n"
+                    "• Establecer procedimientos de respuesta a brechas de seguridad\n\n"
+                )
             
             if 'infraestructura' in context_lower:
-                response += "**Infraestructura y Arquitectura:**\n"
-                response += "• Diseñar arquitecturas resilientes y escalables\n"
-                response += "• Implementar redundancia y planes de continuidad\n"
-                response += "• Adoptar principios de Zero Trust Architecture\n"
-                response += "• Monitorear y mantener la infraestructura crítica\n\n"
+                parts.append(
+                    "**Infraestructura y Arquitectura:**\n"
+                    "• Diseñar arquitecturas resilientes y escalables\n"
+                    "• Implementar redundancia y planes de continuidad\n"
+                    "• Adoptar principios de Zero Trust Architecture\n"
+                    "• Monitorear y mantener la infraestructura crítica\n\n"
+                )
             
-            response += "**📋 Recomendaciones de cumplimiento:**\n"
-            response += "• Mantenerse actualizado con la normativa colombiana vigente\n"
-            response += "• Participar en programas de capacitación en ciberseguridad\n"
-            response += "• Colaborar con entidades gubernamentales en temas de seguridad digital\n"
-            response += "• Implementar ciclos de mejora continua en seguridad\n"
+            parts.append(
+                "**📋 Recomendaciones de cumplimiento:**\n"
+                "• Mantenerse actualizado con la normativa colombiana vigente\n"
+                "• Participar en programas de capacitación en ciberseguridad\n"
+                "• Colaborar con entidades gubernamentales en temas de seguridad digital\n"
+                "• Implementar ciclos de mejora continua en seguridad\n"
+            )
             
-            return response
+            return ''.join(parts)
         
         return self._extract_general_relevant_info("desarrolladores tecnología sistemas", context, [doc] if doc else [])
 
     def _extract_document_overview(self, context: str, doc: Dict) -> str:
         """Extraer resumen y overview del documento"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
         
         # Buscar resumen ejecutivo, introducción, antecedentes
         overview_sections = []
         current_section = []
         
-        for line in lines[:200]:  # Primeras 200 líneas donde suele estar el resumen
-            line_clean = line.strip()
+        for i, line_clean in enumerate(parsed.lines_clean[:200]):  # Primeras 200 líneas donde suele estar el resumen
             if not line_clean:
                 if current_section:
                     overview_sections.append(' '.join(current_section))
@@ -1220,7 +1960,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                 continue
             
             # Identificar secciones de resumen
-            if any(keyword in line_clean.lower() for keyword in ['resumen', 'antecedentes', 'introducción', 'contexto', 'justificación']):
+            if _OVERVIEW_KEYWORDS_RE.search(parsed.lines_lower[i]):
                 if current_section:
                     overview_sections.append(' '.join(current_section))
                 current_section = [line_clean]
@@ -1237,15 +1977,15 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if overview_sections:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "el documento"
             
-            response = f"**Resumen de {doc_name}:**\n\n"
+            parts = [f"**Resumen de {doc_name}:**\n\n"]
             
             for i, section in enumerate(overview_sections[:3], 1):
-                section = re.sub(r'\s+', ' ', section)
+                section = _WS_RE.sub(' ', section)
                 if len(section) > 4000:
                     section = section[:4000] + "..."
-                response += f"**Sección {i}:**\n{section}\n\n"
+                parts.append(f"**Sección {i}:**\n{section}\n\n")
             
-            return response
+            return ''.join(parts)
         
         return self._extract_general_relevant_info("resumen información", context, [doc] if doc else [])
 
@@ -1253,25 +1993,17 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         """
         PRINCIPIO: Separación de responsabilidades - Solo encontrar, no formatear
         """
-        # Mapeo preciso de patrones
-        term_definitions = {
-            'tratamiento': r'g\)\s*Tratamiento:\s*(.*?)(?=\n[a-z]\)|TÍTULO|$)',
-            'responsable': r'e\)\s*Responsable del Tratamiento:\s*(.*?)(?=\nf\)|TÍTULO|$)', 
-            'titular': r'f\)\s*Titular:\s*(.*?)(?=\ng\)|TÍTULO|$)',
-            'encargado': r'd\)\s*Encargado del Tratamiento:\s*(.*?)(?=\ne\)|TÍTULO|$)'
-        }
-        
-        pattern = term_definitions.get(term)
+        # Mapeo preciso de patrones (precompilados, multilínea)
+        pattern = _TERM_DEFINITION_RES.get(term)
         if not pattern:
             return {'found': False, 'error': f'Término "{term}" no configurado'}
         
-        # Buscar con regex multilinea
-        match = re.search(pattern, text, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+        match = pattern.search(text)
         
         if match:
             definition_text = match.group(1).strip()
             # Limpiar definición
-            definition_text = re.sub(r'\s+', ' ', definition_text)
+            definition_text = _WS_RE.sub(' ', definition_text)
             return {
                 'found': True, 
                 'definition': f"{term.title()}: {definition_text}",
@@ -1293,15 +2025,8 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         response += f'"{definition_result["definition"]}"\n\n'
         
         # Contexto específico por término
-        context_info = {
-            'tratamiento': "**Alcance:** Incluye recolección, almacenamiento, uso, circulación o supresión de datos.",
-            'responsable': "**Rol:** Decide sobre la finalidad y el tratamiento de los datos personales.",
-            'titular': "**Limitación:** Solo personas naturales pueden ser titulares.",
-            'encargado': "**Función:** Realiza el tratamiento por cuenta del responsable."
-        }
-        
-        if term in context_info:
-            response += context_info[term] + "\n"
+        if term in _TERM_CONTEXT_INFO:
+            response += _TERM_CONTEXT_INFO[term] + "\n"
         
         return response
     
@@ -1321,183 +2046,157 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
     
     def _extract_responsable_obligations(self, context: str, doc: Dict) -> str:
         """Extraer las obligaciones del responsable del Artículo 17"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         obligations_found = []
         
-        # Buscar el Artículo 17
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            if re.search(r'Artículo\s+17[°º]?\.?\s*', line_clean, re.IGNORECASE):
-                # Verificar que sea sobre deberes/obligaciones (puede estar en la misma línea o siguiente)
-                context_text = line_clean
-                if i+1 < len(lines):
-                    context_text += ' ' + lines[i+1].strip()
-                
-                if 'deberes' in context_text.lower() or 'obligaciones' in context_text.lower():
-                    # Extraer todas las obligaciones (letras a) hasta o))
-                    for j in range(i+2, min(i+30, len(lines))):
-                        obligation_line = lines[j].strip()
-                        if obligation_line:
-                            # Si es una obligación (empieza con letra))
-                            if re.match(r'^[a-o]\)', obligation_line):
-                                # Extraer la obligación completa
-                                obligation_text = obligation_line
-                                # Continuar si la obligación es multilínea
-                                for k in range(j+1, min(j+5, len(lines))):
-                                    next_line = lines[k].strip()
-                                    if next_line and not re.match(r'^[a-o]\)', next_line):
-                                        obligation_text += ' ' + next_line
-                                    else:
-                                        break
-                                obligations_found.append(obligation_text)
-                            # Si llegamos a otro artículo, terminar
-                            elif re.match(r'^Artículo\s+\d+', obligation_line):
-                                break
-                    break
+        # Ir directamente a los encabezados del Artículo 17
+        for i in parsed.article_indices.get(17, ()):
+            # Verificar que sea sobre deberes/obligaciones (puede estar en la misma línea o siguiente)
+            context_text = parsed.lines_lower[i]
+            if i+1 < len(lines):
+                context_text += ' ' + parsed.lines_lower[i+1]
+            
+            if 'deberes' in context_text or 'obligaciones' in context_text:
+                # Extraer todas las obligaciones (letras a) hasta o))
+                for j in range(i+2, min(i+30, len(lines))):
+                    obligation_line = lines[j]
+                    if obligation_line:
+                        # Si es una obligación (empieza con letra))
+                        if _is_letter_item(obligation_line, 'o'):
+                            # Extraer la obligación completa
+                            obligation_text = obligation_line
+                            # Continuar si la obligación es multilínea
+                            for k in range(j+1, min(j+5, len(lines))):
+                                next_line = lines[k]
+                                if next_line and not _is_letter_item(next_line, 'o'):
+                                    obligation_text += ' ' + next_line
+                                else:
+                                    break
+                            obligations_found.append(obligation_text)
+                        # Si llegamos a otro artículo, terminar
+                        elif parsed.section_types[j] == 'article':
+                            break
+                break
         
         if obligations_found:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "la normativa"
-            response = f"**Deberes del Responsable del Tratamiento según {doc_name} (Artículo 17):**\n\n"
+            parts = [f"**Deberes del Responsable del Tratamiento según {doc_name} (Artículo 17):**\n\n"]
             
             for obligation in obligations_found:
-                response += f"• {obligation}\n\n"
+                parts.append(f"• {obligation}\n\n")
             
-            response += "\n**Importante:** El incumplimiento de estos deberes puede acarrear sanciones por parte de la Superintendencia de Industria y Comercio."
+            parts.append("\n**Importante:** El incumplimiento de estos deberes puede acarrear sanciones por parte de la Superintendencia de Industria y Comercio.")
             
-            return response
+            return ''.join(parts)
         
         return "No encontré información sobre las obligaciones del responsable en el documento consultado."
     
     def _extract_titular_rights(self, context: str, doc: Dict) -> str:
         """Extraer los derechos del titular"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         rights_found = []
         
-        # Buscar el Artículo 8 (Derechos de los titulares)
-        for i, line in enumerate(lines):
-            if re.search(r'Artículo\s+8[°º]?\.?\s*', line, re.IGNORECASE):
-                # Verificar que sea sobre derechos
-                if i+1 < len(lines) and 'derecho' in lines[i+1].lower():
-                    # Extraer todos los derechos
-                    for j in range(i+2, min(i+20, len(lines))):
-                        right_line = lines[j].strip()
-                        if right_line:
-                            # Si es un derecho (empieza con letra))
-                            if re.match(r'^[a-f]\)', right_line):
-                                rights_found.append(right_line)
-                            # Si llegamos a otro artículo, terminar
-                            elif re.match(r'^Artículo\s+\d+', right_line):
-                                break
-                    break
+        # Ir directamente a los encabezados del Artículo 8 (Derechos de los titulares)
+        for i in parsed.article_indices.get(8, ()):
+            # Verificar que sea sobre derechos
+            if i+1 < len(lines) and 'derecho' in parsed.lines_lower[i+1]:
+                # Extraer todos los derechos
+                for j in range(i+2, min(i+20, len(lines))):
+                    right_line = lines[j]
+                    if right_line:
+                        # Si es un derecho (empieza con letra))
+                        if _is_letter_item(right_line, 'f'):
+                            rights_found.append(right_line)
+                        # Si llegamos a otro artículo, terminar
+                        elif parsed.section_types[j] == 'article':
+                            break
+                break
         
         if rights_found:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "la normativa"
-            response = f"**Derechos del Titular según {doc_name} (Artículo 8):**\n\n"
+            parts = [f"**Derechos del Titular según {doc_name} (Artículo 8):**\n\n"]
             
             for right in rights_found:
-                response += f"• {right}\n\n"
+                parts.append(f"• {right}\n\n")
             
-            response += "\n**Nota:** Estos derechos son gratuitos y pueden ejercerse en cualquier momento ante el Responsable del Tratamiento."
+            parts.append("\n**Nota:** Estos derechos son gratuitos y pueden ejercerse en cualquier momento ante el Responsable del Tratamiento.")
             
-            return response
+            return ''.join(parts)
         
         return "No encontré información sobre los derechos del titular en el documento consultado."
 
     def _extract_sensitive_data_info(self, context: str, doc: Dict) -> str:
         """Extraer información específica sobre datos sensibles"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         relevant_sections = []
         
-        # Palabras clave específicas para datos sensibles
-        sensitive_keywords = [
-            'datos sensibles', 'dato sensible', 'información sensible',
-            'afectan la intimidad', 'origen racial', 'orientación política',
-            'convicciones religiosas', 'vida sexual', 'datos biométricos',
-            'salud', 'discriminación'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            line_lower = line_clean.lower()
-            
-            # Buscar definiciones específicas de DATOS SENSIBLES, no otros tipos
-            if any(keyword in line_lower for keyword in ['datos sensibles', 'dato sensible']):
-                # Verificar que sea específicamente sobre datos sensibles
-                if 'datos sensibles:' in line_lower or ('se entiende' in line_lower and 'sensibles' in line_lower):
-                    # Extraer contexto completo de la definición
-                    start = i  # Empezar desde la línea actual
-                    end = min(len(lines), i+15)  # Más contexto para definiciones completas
-                    
-                    definition_lines = []
-                    for j in range(start, end):
-                        line_text = lines[j].strip()
-                        if line_text:
-                            definition_lines.append(line_text)
-                            # Si encontramos otra definición o sección, parar
-                            if j > i and any(stop in line_text.lower() for stop in ['transferencia:', 'transmisión:', 'artículo', 'capítulo']):
-                                break
-                    
-                    if definition_lines and len(' '.join(definition_lines)) > 100:
-                        relevant_sections.append(' '.join(definition_lines))
-                        break  # Una definición completa es suficiente
+        # Solo las líneas que el escáner marcó con términos de datos sensibles
+        for i in parsed.hits['sensitive']:
+            line_lower = parsed.lines_lower[i]
+            # Verificar que sea específicamente sobre datos sensibles
+            if 'datos sensibles:' in line_lower or ('se entiende' in line_lower and 'sensibles' in line_lower):
+                # Extraer contexto completo de la definición
+                start = i  # Empezar desde la línea actual
+                end = min(len(lines), i+15)  # Más contexto para definiciones completas
+                
+                definition_lines = []
+                for j in range(start, end):
+                    line_text = lines[j]
+                    if line_text:
+                        definition_lines.append(line_text)
+                        # Si encontramos otra definición o sección, parar
+                        if j > i and _SENSITIVE_STOP_RE.search(parsed.lines_lower[j]):
+                            break
+                
+                if definition_lines and len(' '.join(definition_lines)) > 100:
+                    relevant_sections.append(' '.join(definition_lines))
+                    break  # Una definición completa es suficiente
         
         if relevant_sections:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "el documento"
             
-            response = f"**Definición de datos sensibles según {doc_name}:**\n\n"
+            parts = [f"**Definición de datos sensibles según {doc_name}:**\n\n"]
             
             for section in relevant_sections:
-                section = re.sub(r'\s+', ' ', section)
-                response += f'"{section}"\n\n'
+                section = _normalize_citation(section)
+                parts.append(f'"{section}"\n\n')
             
             # Agregar implicaciones prácticas
-            response += "**Implicaciones importantes:**\n"
-            response += "• Requieren autorización explícita del titular\n"
-            response += "• El titular no está obligado a autorizar su tratamiento\n"
-            response += "• Se debe informar claramente que son datos sensibles\n"
-            response += "• Ninguna actividad puede condicionarse a su suministro\n"
+            parts.append(_SENSITIVE_DATA_IMPLICATIONS)
             
-            return response
+            return ''.join(parts)
         
         return "No encontré una definición específica de datos sensibles en el documento consultado."
 
     def _extract_implementation_guidance(self, context: str, doc: Dict) -> str:
         """Extraer guías de implementación y cumplimiento"""
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         relevant_sections = []
         
-        # Palabras clave de implementación
-        impl_keywords = [
-            'implementar', 'cumplir', 'aplicar', 'ejecutar', 'desarrollar', 'establecer',
-            'medidas', 'acciones', 'procedimientos', 'requisitos', 'obligaciones',
-            'debe', 'deberá', 'se requiere', 'necesario'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip().lower()
-            if any(keyword in line_clean for keyword in impl_keywords):
-                start = max(0, i-1)
-                end = min(len(lines), i+5)
-                section = []
-                for j in range(start, end):
-                    if lines[j].strip():
-                        section.append(lines[j].strip())
-                
-                if section:
-                    relevant_sections.append(' '.join(section))
+        for i in parsed.hits['implementation']:
+            start = max(0, i-1)
+            end = min(len(lines), i+5)
+            section = [line for line in lines[start:end] if line]
+            
+            if section:
+                relevant_sections.append(' '.join(section))
         
         if relevant_sections:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "el documento"
             
-            response = f"**Guía de implementación según {doc_name}:**\n\n"
+            parts = [f"**Guía de implementación según {doc_name}:**\n\n"]
             
             for i, section in enumerate(relevant_sections[:4], 1):
-                section = re.sub(r'\s+', ' ', section)
+                section = _WS_RE.sub(' ', section)
                 if len(section) > 700:
                     section = section[:700] + "..."
-                response += f"**Punto {i}:** {section}\n\n"
+                parts.append(f"**Punto {i}:** {section}\n\n")
             
-            return response
+            return ''.join(parts)
         
         return self._extract_general_relevant_info("implementación medidas", context, [doc] if doc else [])
 
@@ -1510,219 +2209,206 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         query_analysis = self._analyze_query_semantics(query_lower)
         
         # 2. BÚSQUEDA INTELIGENTE EN CONTEXTO
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         scored_sections = []
         
+        # Términos de la consulta por línea, contados en un solo recorrido del texto;
+        # cada sección solo suma los conteos de sus líneas
+        line_term_counts = self._count_terms_by_line(parsed, query_analysis)
+        
         # Agrupar líneas en secciones semánticas
         current_section = []
+        current_counts = Counter()
+        current_structured = False
+        current_len = 0  # Longitud de ' '.join(current_section), mantenida incrementalmente
         section_type = None
+        skip_lines = set(parsed.hits['skip'])
+        structure_lines = set(parsed.hits['structure'])
         
-        # Skipear encabezados genéricos
-        skip_patterns = [
-            'decreto 1377 de 2013',
-            'reglamenta parcialmente la ley',
-            'considerando:',
-            'decreta:',
-            'el presidente de la república'
-        ]
-        
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            
+        for i, line_clean in enumerate(lines):
             # Ignorar líneas genéricas del encabezado
-            if any(skip in line_clean.lower() for skip in skip_patterns):
+            if i in skip_lines:
                 continue
                 
             if not line_clean:
-                if current_section and len(' '.join(current_section)) > 40:  # Solo secciones sustanciales
+                if current_section and current_len > 40:  # Solo secciones sustanciales
                     section_result = self._score_section(
-                        current_section, 
+                        current_counts, 
+                        current_structured, 
                         query_analysis, 
                         section_type,
+                        current_len,
                         i - len(current_section)
                     )
                     if section_result['score'] > 0:  # Solo agregar si tiene relevancia
+                        # El texto se une solo para las secciones que se conservan
+                        section_result['content'] = ' '.join(current_section)
                         scored_sections.append(section_result)
                 current_section = []
+                current_counts = Counter()
+                current_structured = False
+                current_len = 0
                 section_type = None
                 continue
             
-            # Detectar tipo de sección
-            line_lower = line_clean.lower()
-            if re.match(r'^artículo\s+\d+', line_lower):
-                section_type = 'article'
-            elif re.match(r'^(capítulo|título|sección)', line_lower):
-                section_type = 'chapter'
-            elif any(defn in line_lower for defn in ['se entiende', 'definición', 'significa']):
-                section_type = 'definition'
-            elif any(req in line_lower for req in ['debe', 'deberá', 'obligación', 'requisito']):
-                section_type = 'requirement'
+            # Detectar tipo de sección (precalculado al procesar el contexto)
+            if parsed.section_types[i]:
+                section_type = parsed.section_types[i]
             
+            current_len += len(line_clean) + (1 if current_section else 0)
             current_section.append(line_clean)
+            line_counts = line_term_counts.get(i)
+            if line_counts:
+                current_counts.update(line_counts)
+            if i in structure_lines:
+                current_structured = True
         
         # Procesar última sección
         if current_section:
-            scored_sections.append(self._score_section(
-                current_section, 
+            section_result = self._score_section(
+                current_counts, 
+                current_structured, 
                 query_analysis, 
                 section_type,
+                current_len,
                 len(lines) - len(current_section)
-            ))
+            )
+            if section_result['score'] > 0:
+                section_result['content'] = ' '.join(current_section)
+                scored_sections.append(section_result)
         
         # 3. SELECCIÓN INTELIGENTE DE SECCIONES
-        # Filtrar secciones con score > 0
-        relevant_sections = [s for s in scored_sections if s['score'] > 0]
-        
-        # Ordenar por relevancia
-        relevant_sections.sort(key=lambda x: x['score'], reverse=True)
+        # Solo se muestran las 6 más relevantes (todas tienen score > 0): selección
+        # parcial con heap en lugar de ordenar la lista completa
+        relevant_sections = heapq.nlargest(6, scored_sections, key=lambda x: x['score'])
         
         # 4. CONSTRUCCIÓN DE RESPUESTA INTELIGENTE
         if relevant_sections:
             doc_info = sources[0] if sources else None
             doc_name = f"{doc_info['tipo_norma']} {doc_info['numero']} de {doc_info['año']}" if doc_info else "la normativa"
             
-            response = f"**Información relevante encontrada en {doc_name}:**\n\n"
+            parts = [f"**Información relevante encontrada en {doc_name}:**\n\n"]
             
-            # Agrupar por tipo de contenido
-            articles = [s for s in relevant_sections[:6] if s['type'] == 'article']
-            definitions = [s for s in relevant_sections[:6] if s['type'] == 'definition']
-            requirements = [s for s in relevant_sections[:6] if s['type'] == 'requirement']
-            others = [s for s in relevant_sections[:6] if s['type'] not in ['article', 'definition', 'requirement']]
+            # Agrupar por tipo de contenido en un solo recorrido
+            buckets = {'article': [], 'definition': [], 'requirement': [], 'other': []}
+            for section in relevant_sections:
+                buckets.get(section['type'], buckets['other']).append(section)
+            articles = buckets['article']
+            definitions = buckets['definition']
+            requirements = buckets['requirement']
+            others = buckets['other']
             
             # Mostrar en orden lógico
             shown_count = 0
             
             # Primero definiciones si las hay
             if definitions and shown_count < 3:
-                response += "**📖 Definiciones:**\n"
+                parts.append("**📖 Definiciones:**\n")
                 for section in definitions[:2]:
-                    response += f"• {self._format_section_content(section['content'])}\n\n"
+                    parts.append(f"• {self._format_section_content(section['content'])}\n\n")
                     shown_count += 1
             
             # Luego artículos relevantes
             if articles and shown_count < 4:
-                response += "**📋 Artículos relevantes:**\n"
+                parts.append("**📋 Artículos relevantes:**\n")
                 for section in articles[:2]:
-                    response += f"• {self._format_section_content(section['content'])}\n\n"
+                    parts.append(f"• {self._format_section_content(section['content'])}\n\n")
                     shown_count += 1
             
             # Después requisitos/obligaciones
             if requirements and shown_count < 5:
-                response += "**⚖️ Requisitos y obligaciones:**\n"
+                parts.append("**⚖️ Requisitos y obligaciones:**\n")
                 for section in requirements[:2]:
-                    response += f"• {self._format_section_content(section['content'])}\n\n"
+                    parts.append(f"• {self._format_section_content(section['content'])}\n\n")
                     shown_count += 1
             
             # Finalmente otra información relevante
             if others and shown_count < 5:
-                response += "**ℹ️ Información adicional:**\n"
+                parts.append("**ℹ️ Información adicional:**\n")
                 for section in others[:1]:
-                    response += f"• {self._format_section_content(section['content'])}\n\n"
+                    parts.append(f"• {self._format_section_content(section['content'])}\n\n")
                     shown_count += 1
             
-            return response
+            return ''.join(parts)
         
         return "No encontré información específicamente relevante para tu consulta en el documento disponible."
     
-    def _analyze_query_semantics(self, query: str) -> Dict[str, Any]:
-        """Analizar semánticamente la consulta para extraer términos con pesos"""
-        # Palabras vacías en español
-        stop_words = {
-            'el', 'la', 'de', 'en', 'y', 'a', 'los', 'las', 'un', 'una', 'para', 'con',
-            'por', 'del', 'al', 'es', 'son', 'se', 'su', 'que', 'como', 'más', 'sobre',
-            'qué', 'cuál', 'cuáles', 'dice', 'establece', 'define', 'menciona'
-        }
-        
-        # Términos legales importantes
-        legal_terms = {
-            'artículo', 'ley', 'decreto', 'resolución', 'circular', 'capítulo',
-            'obligación', 'derecho', 'deber', 'requisito', 'procedimiento',
-            'sanción', 'infracción', 'responsable', 'titular', 'tratamiento'
-        }
-        
-        # Términos técnicos importantes
-        tech_terms = {
-            'datos', 'información', 'seguridad', 'protección', 'privacidad',
-            'autorización', 'consentimiento', 'transferencia', 'sensible',
-            'personal', 'confidencial', 'acceso', 'uso', 'finalidad'
-        }
-        
-        words = query.split()
-        terms = {}
-        
-        for word in words:
-            word_clean = word.lower().strip('.,;:?¿!¡')
-            
-            if word_clean in stop_words or len(word_clean) < 3:
-                continue
-            
-            # Asignar pesos según tipo
-            if word_clean in legal_terms:
-                terms[word_clean] = 3  # Alta prioridad
-            elif word_clean in tech_terms:
-                terms[word_clean] = 2  # Media prioridad
-            else:
-                terms[word_clean] = 1  # Prioridad normal
-        
-        return {
-            'terms': terms,
-            'has_article_ref': any('artículo' in w.lower() for w in words),
-            'has_number': any(w.isdigit() for w in words),
-            'query_type': self._determine_query_type(query)
-        }
+    def _analyze_query_semantics(self, query: str) -> QueryAnalysis:
+        """Analizar semánticamente la consulta (resultado cacheado por texto de consulta)"""
+        return _analyze_query_semantics(query)
     
     def _determine_query_type(self, query: str) -> str:
-        """Determinar el tipo de consulta para mejor procesamiento"""
-        query_lower = query.lower()
-        
-        if any(q in query_lower for q in ['qué es', 'definición', 'concepto']):
-            return 'definition'
-        elif any(q in query_lower for q in ['obligación', 'debe', 'requisito']):
-            return 'requirement'
-        elif any(q in query_lower for q in ['procedimiento', 'cómo', 'pasos']):
-            return 'procedure'
-        elif any(q in query_lower for q in ['sanción', 'multa', 'penalidad']):
-            return 'sanction'
-        else:
-            return 'general'
+        """Determinar el tipo de consulta (resultado cacheado por texto de consulta)"""
+        return _determine_query_type(query)
     
-    def _score_section(self, lines: List[str], query_analysis: Dict, section_type: str, start_line: int) -> Dict:
-        """Puntuar una sección según su relevancia"""
-        section_text = ' '.join(lines)
-        section_lower = section_text.lower()
-        
+    def _count_terms_by_line(self, parsed: ParsedContext, query_analysis: QueryAnalysis) -> Dict[int, Counter]:
+        """Contar los términos de la consulta por línea en un solo recorrido del texto"""
+        # Los términos no contienen espacios, así que ninguna coincidencia cruza líneas
+        # y el conteo sobre el texto unido equivale al conteo línea por línea
+        line_counts = {}
+        terms_re = query_analysis.terms_re
+        if terms_re is None:
+            return line_counts
+        
+        # Igual que str.count por término: search desde la posición siguiente para ver los
+        # términos que se solapan con otro, y cada término solo cuenta si no se solapa
+        # con su propia ocurrencia anterior
+        owners = query_analysis.term_owners
+        line_starts = parsed.line_starts
+        text = parsed.text_lower
+        last_end = {}
+        search = terms_re.search
+        match = search(text)
+        while match:
+            start = match.start()
+            counts = None
+            for term in owners[match.group()]:
+                if start >= last_end.get(term, 0):
+                    last_end[term] = start + len(term)
+                    if counts is None:
+                        idx = bisect_right(line_starts, start) - 1
+                        counts = line_counts.get(idx)
+                        if counts is None:
+                            counts = line_counts[idx] = Counter()
+                    counts[term] += 1
+            match = search(text, start + 1)
+        return line_counts
+    
+    def _score_section(self, counts: Counter, has_structure: bool, query_analysis: QueryAnalysis,
+                       section_type: str, section_len: int, start_line: int) -> Dict:
+        """Puntuar una sección a partir de los conteos de términos de sus líneas"""
         score = 0
         matched_terms = []
         
         # Puntuar según términos de consulta
-        for term, weight in query_analysis['terms'].items():
-            if term in section_lower:
+        for term, weight in query_analysis.terms:
+            occurrences = counts[term]
+            if occurrences:
                 # Más puntos si el término aparece múltiples veces
-                occurrences = section_lower.count(term)
                 score += weight * min(occurrences, 3)
                 matched_terms.append(term)
         
         # Bonus por tipo de sección según tipo de consulta
-        query_type = query_analysis['query_type']
+        query_type = query_analysis.query_type
         if section_type == 'definition' and query_type == 'definition':
             score += 5
         elif section_type == 'requirement' and query_type == 'requirement':
             score += 5
-        elif section_type == 'article' and query_analysis['has_article_ref']:
+        elif section_type == 'article' and query_analysis.has_article_ref:
             score += 3
         
         # Penalizar secciones muy cortas o muy largas
-        if len(section_text) < 50:
+        if section_len < 50:
             score *= 0.5
-        elif len(section_text) > 8000:
+        elif section_len > 8000:
             score *= 0.8
         
         # Bonus por contenido estructurado
-        if any(marker in section_lower for marker in ['1.', '2.', 'a)', 'b)', '•']):
+        if has_structure:
             score += 2
         
         return {
-            'content': section_text,
             'score': score,
             'type': section_type or 'general',
             'matched_terms': matched_terms,
@@ -1732,20 +2418,13 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
     def _format_section_content(self, content: str) -> str:
         """Formatear contenido de sección para mejor legibilidad"""
         # Limpiar marcadores de contexto
-        content = re.sub(r'^---.*?---\s*', '', content)
+        content = _CONTEXT_MARKER_RE.sub('', content)
         
         # Limpiar espacios excesivos
-        content = re.sub(r'\s+', ' ', content)
+        content = _WS_RE.sub(' ', content)
         
         # Remover encabezados repetitivos
-        generic_headers = [
-            'Decreto 1377 de 2013',
-            'Ley 1581 de 2012',
-            'Reglamenta parcialmente',
-            'Por la cual se dictan disposiciones'
-        ]
-        
-        for header in generic_headers:
+        for header in _GENERIC_HEADERS:
             if content.startswith(header):
                 # Buscar el primer punto o dos puntos para cortar
                 cut_point = content.find('. ')
@@ -1756,15 +2435,18 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if len(content) > 10000:
             # Buscar un punto de corte natural SOLO si es extremadamente largo
             sentences = content.split('. ')
-            truncated = ""
+            # Acumular longitudes (oración + ". ") y unir una sola vez hasta el corte
+            cum = 0
+            cut = 0
             for sentence in sentences:
-                if len(truncated) + len(sentence) < 8000:
-                    truncated += sentence + ". "
-                else:
+                if cum + len(sentence) >= 8000:
                     break
-            content = truncated.strip()
-            if not content.endswith('.'):
-                content += "..."
+                cum += len(sentence) + 2
+                cut += 1
+            if cut:
+                content = ('. '.join(sentences[:cut]) + '.').strip()
+            else:
+                content = "..."
         
         return content.strip()
 
@@ -1773,7 +2455,8 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         Validación estricta de relevancia antes de responder
         """
         query_lower = user_query.lower()
-        content_lower = content.lower()
+        # El contexto ya procesado trae su versión en minúsculas
+        content_lower = self._parse_context(content).text_lower
         
         # Términos críticos que deben coincidir
         critical_terms = []
@@ -1797,12 +2480,12 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
             # Si pregunta por datos personales pero el doc es de comercio exterior sin mencionar datos
             (any(term in query_lower for term in ['datos personales', 'protección datos']) and 
              'comercio exterior' in content_lower and 
-             not any(term in content_lower for term in ['datos personales', 'protección', 'tratamiento'])),
+             not _PERSONAL_DATA_CONTENT_RE.search(content_lower)),
             
             # Si pregunta por ISO 27001 pero menciona decretos sectoriales sin relación
             (any(term in query_lower for term in ['iso', '27001', 'implementar']) and
-             any(sector in content_lower for sector in ['sector trabajo', 'sector comercio']) and
-             not any(term in content_lower for term in ['seguridad', 'información', 'gestión', 'iso'])),
+             _SECTORAL_CONTENT_RE.search(content_lower) and
+             not _SECURITY_CONTENT_RE.search(content_lower)),
         ]
         
         # Si es irrelevante, rechazar
@@ -1812,7 +2495,7 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                 'reason': 'El documento no contiene información directamente relacionada con la consulta'
             }
         
-        # Verificar coincidencias mínimas
+        # Verificar coincidencias mínimas (subcadenas: 'reclamo' también cuenta dentro de 'reclamos')
         query_words = [word for word in query_lower.split() if len(word) > 3]
         content_matches = sum(1 for word in query_words if word in content_lower)
         
@@ -1828,38 +2511,52 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         """
         Extraer citas textuales específicas, no interpretaciones
         """
-        lines = content.split('\n')
+        if not query_terms:
+            return []
+        
+        key = (content, tuple(query_terms))
+        citations = self._textual_citations.get(key)
+        if citations is None:
+            citations = self._collect_textual_citations(content, key[1])
+            _bounded_put(self._textual_citations, key, citations)
+        return citations
+    
+    def _collect_textual_citations(self, content: str, query_terms: Tuple[str, ...]) -> List[str]:
+        """Recorrer el contexto buscando hasta 3 citas con términos de la consulta"""
+        parsed = self._parse_context(content)
+        lines = parsed.lines_clean
         citations = []
         
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
+        # Un solo recorrido de la alternancia de términos sobre el texto completo;
+        # cada coincidencia se asigna a su línea (solo incluye líneas con términos de la consulta)
+        last = -1
+        for match in _query_terms_pattern(query_terms).finditer(parsed.text_lower):
+            i = bisect_right(parsed.line_starts, match.start()) - 1
+            if i == last:
+                continue
+            last = i
+            
+            line_clean = lines[i]
             if len(line_clean) < 20:  # Muy corto para ser útil
                 continue
+            
+            # Agregar contexto si es un artículo o definición
+            if _CITATION_MARKERS_RE.search(parsed.lines_lower[i]):
+                # Extraer contexto ampliado para artículos
+                context_lines = [line for line in lines[max(0, i-1):i+5] if line]
                 
-            line_lower = line_clean.lower()
-            
-            # Solo incluir si contiene términos específicos de la consulta
-            if any(term in line_lower for term in query_terms):
-                # Agregar contexto si es un artículo o definición
-                if any(marker in line_lower for marker in ['artículo', 'definición', 'establece', 'dispone']):
-                    # Extraer contexto ampliado para artículos
-                    start = max(0, i-1)
-                    end = min(len(lines), i+5)
-                    context_lines = []
-                    for j in range(start, end):
-                        if lines[j].strip():
-                            context_lines.append(lines[j].strip())
-                    
-                    if context_lines:
-                        citation = ' '.join(context_lines)
-                        if len(citation) > 100:  # Solo citas sustanciales
-                            citations.append(citation)
-                else:
-                    # Cita directa de la línea
-                    if len(line_clean) > 50:
-                        citations.append(line_clean)
+                if context_lines:
+                    citation = ' '.join(context_lines)
+                    if len(citation) > 100:  # Solo citas sustanciales
+                        citations.append(citation)
+            elif len(line_clean) > 50:
+                # Cita directa de la línea
+                citations.append(line_clean)
+            
+            if len(citations) >= 3:  # Máximo 3 citas más relevantes
+                break
         
-        return citations[:3]  # Máximo 3 citas más relevantes
+        return citations
 
     def _basic_search_response(self, user_query: str, context: str, sources: List[Dict]) -> Dict[str, Any]:
         """
@@ -1874,28 +2571,25 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                 }
             
             # PRIORIZAR SISTEMA DE RESPUESTAS ESTRUCTURADAS 
+            # Consulta normalizada y términos clave, calculados una sola vez
             query_lower = user_query.lower()
+            query_terms = [word for word in query_lower.split() if len(word) > 3]
             
             # Para consultas sobre temas fundamentales, SALTARSE validación de relevancia
-            is_fundamental_query = any(term in query_lower for term in [
-                'obligaciones', 'derechos', 'qué es', 'definición', 'tratamiento', 
-                'responsable', 'titular', 'encargado', 'datos sensibles', 'aviso', 'privacidad'
-            ])
+            is_fundamental_query = 'fundamental' in _query_topics(query_lower)
+            
+            # La respuesta estructurada se calcula una sola vez para ambos caminos
+            structured_response = self._generate_structured_response(user_query, context, sources)
             
-            if is_fundamental_query:
+            if is_fundamental_query and structured_response:
                 # USAR DIRECTAMENTE el sistema estructurado sin validación previa
-                structured_response = self._generate_structured_response(user_query, context, sources)
-                
-                if structured_response:
-                    return {
-                        'success': True,
-                        'response': structured_response,
-                        'sources': [doc['nombre_archivo'] for doc in sources]
-                    }
+                return {
+                    'success': True,
+                    'response': structured_response,
+                    'sources': [doc['nombre_archivo'] for doc in sources]
+                }
             
             # Para consultas no fundamentales, usar sistema con validación
-            structured_response = self._generate_structured_response(user_query, context, sources)
-            
             # Si la respuesta estructurada es satisfactoria, usarla
             if structured_response and not structured_response.startswith("❌ Error:") and "No encontré" not in structured_response:
                 return {
@@ -1915,10 +2609,6 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                     'sources': []
                 }
             
-            # Extraer términos clave de la consulta
-            query_lower = user_query.lower()
-            query_terms = [word for word in query_lower.split() if len(word) > 3]
-            
             # Extraer citas textuales específicas
             textual_citations = self._extract_textual_citations(context, query_terms)
             
@@ -1935,16 +2625,17 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
             # Si no hay respuesta estructurada específica, usar citas textuales
             if structured_response == "**Información encontrada:**\n\nNo se encontraron secciones específicamente relevantes para tu consulta en el documento disponible.":
                 doc_name = f"{main_doc['tipo_norma']} {main_doc['numero']} de {main_doc['año']}"
-                response = f"**Información encontrada en {doc_name}:**\n\n"
+                parts = [f"**Información encontrada en {doc_name}:**\n\n"]
                 
                 for i, citation in enumerate(textual_citations, 1):
-                    citation = re.sub(r'\s+', ' ', citation)
+                    citation = _normalize_citation(citation)
                     if len(citation) > 3000:
                         citation = citation[:3000] + "..."
-                    response += f"**{i}.** \"{citation}\"\n\n"
+                    parts.append(f"**{i}.** \"{citation}\"\n\n")
                 
-                response += f"\n**Fuente:** {doc_name}\n"
-                response += "\n*Nota: Esta respuesta se basa exclusivamente en el contenido textual del documento mencionado.*"
+                parts.append(f"\n**Fuente:** {doc_name}\n")
+                parts.append("\n*Nota: Esta respuesta se basa exclusivamente en el contenido textual del documento mencionado.*")
+                response = ''.join(parts)
             else:
                 response = structured_response
             
@@ -1954,7 +2645,9 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
                 'sources': [main_doc['nombre_archivo']]
             }
             
-        except Exception as e:
+        except (KeyError, IndexError, TypeError, AttributeError, ValueError, re.error) as e:
+            # Solo errores de datos o de extracción; el resto se propaga con su traza
+            print(f"Error en respuesta básica: {e!r}")
             return {
                 'success': False,
                 'response': f'Error procesando la consulta. Por favor, intenta con términos más específicos.',
@@ -1963,152 +2656,105 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
     
     def _extract_privacy_notice_info(self, context: str, doc: Dict) -> str:
         """Extraer información sobre aviso de privacidad"""
-        import re
-        
         # Buscar definición de aviso de privacidad
-        pattern = r'(Aviso de privacidad:.*?)(?=\n\d+\.|$)'
-        match = re.search(pattern, context, re.MULTILINE | re.DOTALL | re.IGNORECASE)
+        match = _PRIVACY_DEF_RE.search(context)
         
         if match:
             definition = match.group(1).strip()
-            definition = re.sub(r'\s+', ' ', definition)
+            definition = _WS_RE.sub(' ', definition)
             
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "la normativa"
             
-            response = f"**Definición de aviso de privacidad según {doc_name}:**\n\n"
-            response += f'"{definition}"\n\n'
-            response += "**Características del aviso de privacidad:**\n"
-            response += "• Es una comunicación verbal o escrita\n"
-            response += "• Informa sobre la existencia de políticas de tratamiento\n"
-            response += "• Indica cómo acceder a las políticas\n"
-            response += "• Describe las finalidades del tratamiento\n"
+            parts = [f"**Definición de aviso de privacidad según {doc_name}:**\n\n"]
+            parts.append(f'"{definition}"\n\n')
+            parts.append(_PRIVACY_NOTICE_FEATURES)
             
-            return response
+            return ''.join(parts)
         
         return "No encontré información específica sobre aviso de privacidad en el documento."
     
     def _extract_data_retention_info(self, context: str, doc: Dict) -> str:
         """Extraer información sobre conservación de datos"""
-        import re
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['retention'].search(context):
+            return _TOPIC_NO_INFO['retention']
         
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         retention_info = []
         
         # Buscar información sobre limitaciones temporales
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['limitaciones temporales', 'conservar', 'tiempo', 'supresión']):
-                # Extraer contexto de 5 líneas
-                context_lines = []
-                for j in range(max(0, i-2), min(len(lines), i+8)):
-                    if lines[j].strip():
-                        context_lines.append(lines[j].strip())
-                
-                if context_lines:
-                    section_text = ' '.join(context_lines)
-                    if len(section_text) > 100:  # Solo secciones sustanciales
-                        retention_info.append(section_text)
-                        break
+        for i in _topic_lines(parsed, _RETENTION_TERMS_RE):
+            # Extraer contexto de 5 líneas
+            context_lines = [line for line in lines[max(0, i-2):i+8] if line]
+            
+            if context_lines:
+                section_text = ' '.join(context_lines)
+                if len(section_text) > 100:  # Solo secciones sustanciales
+                    retention_info.append(section_text)
+                    break
         
         if retention_info:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "la normativa"
             
-            response = f"**Conservación de datos según {doc_name}:**\n\n"
+            parts = [f"**Conservación de datos según {doc_name}:**\n\n"]
             for info in retention_info:
-                info = re.sub(r'\s+', ' ', info)
-                response += f'"{info}"\n\n'
+                info = _normalize_citation(info)
+                parts.append(f'"{info}"\n\n')
             
-            response += "**Principios clave:**\n"
-            response += "• Solo durante el tiempo razonable y necesario\n"
-            response += "• Según las finalidades que justificaron el tratamiento\n"
-            response += "• Cumplir obligaciones legales o contractuales\n"
-            response += "• Documentar procedimientos de conservación y supresión\n"
+            parts.append(_RETENTION_PRINCIPLES)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre conservación de datos en el documento."
+        return _TOPIC_NO_INFO['retention']
     
     def _extract_sensitive_data_handling(self, context: str, doc: Dict) -> str:
         """Extraer información sobre manejo de datos sensibles"""
-        import re
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['sensitive_handling'].search(context):
+            return _TOPIC_NO_INFO['sensitive_handling']
         
-        lines = context.split('\n')
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         handling_info = []
         
         # Buscar información sobre tratamiento de datos sensibles
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['tratamiento de datos sensibles', 'datos sensibles', 'autorización para']):
-                if 'sensibles' in line_lower:
-                    # Extraer contexto amplio
-                    context_lines = []
-                    for j in range(max(0, i-1), min(len(lines), i+10)):
-                        if lines[j].strip():
-                            context_lines.append(lines[j].strip())
-                    
-                    if context_lines:
-                        section_text = ' '.join(context_lines)
-                        if len(section_text) > 150:
-                            handling_info.append(section_text)
-                            break
+        for i in _topic_lines(parsed, _SENSITIVE_HANDLING_TERMS_RE):
+            if 'sensibles' in parsed.lines_lower[i]:
+                # Extraer contexto amplio
+                context_lines = [line for line in lines[max(0, i-1):i+10] if line]
+                
+                if context_lines:
+                    section_text = ' '.join(context_lines)
+                    if len(section_text) > 150:
+                        handling_info.append(section_text)
+                        break
         
         if handling_info:
             doc_name = f"{doc['tipo_norma']} {doc['numero']} de {doc['año']}" if doc else "la normativa"
             
-            response = f"**Manejo de datos sensibles según {doc_name}:**\n\n"
+            parts = [f"**Manejo de datos sensibles según {doc_name}:**\n\n"]
             for info in handling_info:
-                info = re.sub(r'\s+', ' ', info)
-                response += f'"{info}"\n\n'
+                info = _normalize_citation(info)
+                parts.append(f'"{info}"\n\n')
             
-            response += "**Requisitos especiales:**\n"
-            response += "• Informar que no está obligado a autorizar\n"
-            response += "• Obtener consentimiento explícito\n"
-            response += "• Informar cuáles datos son sensibles\n"
-            response += "• No condicionar actividades a su suministro\n"
+            parts.append(_SENSITIVE_HANDLING_REQUIREMENTS)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre manejo de datos sensibles en el documento."
+        return _TOPIC_NO_INFO['sensitive_handling']
     
-    def _extract_security_relevant_info(self, user_query: str, context: str, sources: List[Dict]) -> str:
+    def _extract_security_relevant_info(self, user_query: str, context: str, sources: List[Dict],
+                                        query_lower: Optional[str] = None) -> str:
         """
         Extraer información relevante para seguridad de la información y conectar con ISO 27001
         """
-        import re
-        
-        query_lower = user_query.lower()
-        
-        # CONEXIONES ESPECÍFICAS CON SEGURIDAD DE LA INFORMACIÓN
-        if any(term in query_lower for term in ['iso', '27001', 'seguridad información', 'implementar']):
-            return self._extract_iso27001_connections(context, sources)
-        
-        # PRINCIPIOS DE TRATAMIENTO (relevantes para controles de seguridad)
-        if 'principios' in query_lower:
-            return self._extract_data_principles_for_security(context, sources)
-        
-        # AUTORIZACIÓN (control de acceso)
-        if 'autorización' in query_lower:
-            return self._extract_authorization_controls(context, sources)
-        
-        # POLÍTICAS DE TRATAMIENTO (documentación de seguridad)
-        if any(term in query_lower for term in ['política', 'procedimiento', 'manual']):
-            return self._extract_policy_requirements(context, sources)
-        
-        # HABEAS DATA (derecho de acceso y rectificación)
-        if 'habeas data' in query_lower:
-            return self._extract_data_subject_rights(context, sources)
-        
-        # TRANSFERENCIAS INTERNACIONALES (controles de transferencia)
-        if any(term in query_lower for term in ['transferir', 'transmisión', 'país', 'internacional']):
-            return self._extract_transfer_controls(context, sources)
-        
-        # MENORES DE EDAD (datos especiales)
-        if any(term in query_lower for term in ['menores', 'niños', 'adolescentes']):
-            return self._extract_minors_data_protection(context, sources)
-        
-        # VIDEOVIGILANCIA (monitoreo y control)
-        if 'videovigilancia' in query_lower:
-            return self._extract_surveillance_requirements(context, sources)
+        # Todos los temas de la consulta en un solo recorrido; el tema ganador se
+        # resuelve una vez por combinación de temas y se despacha por tabla
+        topics = _query_topics(query_lower if query_lower is not None else user_query.lower())
+        topic = _security_topic(topics)
+        if topic is not None:
+            return self._security_handlers[topic](context, sources)
         
         # FALLBACK: Respuesta educativa sobre la conexión
         return self._explain_data_protection_security_connection(user_query, sources)
@@ -2118,63 +2764,53 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         
         doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa colombiana"
         
-        response = f"**Conexión entre {doc_name} e ISO 27001:**\n\n"
+        parts = [f"**Conexión entre {doc_name} e ISO 27001:**\n\n"]
         
-        response += "**📋 Controles ISO 27001 relacionados:**\n"
-        response += "• **A.18.1** - Cumplimiento de requisitos legales y contractuales\n"
-        response += "• **A.18.2** - Revisiones de seguridad de la información\n"
-        response += "• **A.13.2** - Transferencia de información\n"
-        response += "• **A.9.1** - Controles de acceso a la información\n\n"
+        parts.append(_ISO27001_RELATED_CONTROLS)
         
-        response += "**🔒 Implementación práctica:**\n"
-        response += "• **Clasificación de datos**: Identificar datos personales como información sensible\n"
-        response += "• **Control de acceso**: Implementar autorización del titular como control\n"
-        response += "• **Retención**: Definir períodos según finalidad del tratamiento\n"
-        response += "• **Cifrado**: Proteger datos personales en tránsito y reposo\n"
-        response += "• **Auditoría**: Registrar accesos y modificaciones\n\n"
+        parts.append(_ISO27001_PRACTICE)
         
-        response += "**⚖️ Requisitos normativos específicos:**\n"
+        parts.append("**⚖️ Requisitos normativos específicos:**\n")
         
-        # Extraer información específica del contexto
-        lines = context.split('\n')
+        # Extraer información específica del contexto (el escaneo se detiene en la octava línea)
+        parsed = self._parse_context(context)
         security_relevant = []
         
-        for line in lines:
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['seguridad', 'protección', 'conservar', 'medidas', 'procedimientos', 'autorización']):
-                if len(line.strip()) > 30:  # Solo líneas sustanciales
-                    security_relevant.append(line.strip())
-                    if len(security_relevant) >= 8:
-                        break
+        for i in _topic_lines(parsed, _SECURITY_TERMS_RE):
+            line_clean = parsed.lines_clean[i]
+            if len(line_clean) > 30:  # Solo líneas sustanciales
+                security_relevant.append(line_clean)
+                if len(security_relevant) >= 8:
+                    break
         
         if security_relevant:
             for req in security_relevant:
                 # Limpiar la línea
-                req = re.sub(r'\s+', ' ', req)
-                response += f"• {req[:800]}...\n"
+                req = _squeeze_head(req, 800)
+                parts.append(f"• {req}...\n")
         else:
-            response += "• Garantizar condiciones de seguridad para impedir alteración\n"
-            response += "• Conservar información bajo condiciones apropiadas\n"
-            response += "• Implementar controles de acceso y autorización\n"
+            parts.append(_ISO27001_DEFAULT_REQUIREMENTS)
         
-        response += f"\n**📖 Fuente normativa:** {doc_name}"
+        parts.append(f"\n**📖 Fuente normativa:** {doc_name}")
         
-        return response
+        return ''.join(parts)
     
     def _extract_data_principles_for_security(self, context: str, sources: List[Dict]) -> str:
         """Extraer principios de tratamiento enfocados en seguridad"""
         
-        # Buscar principios específicos
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['principles'].search(context):
+            return _TOPIC_NO_INFO['principles']
+        
+        # Buscar principios específicos (solo en las líneas que mencionan "principio")
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         principles = []
         
-        for i, line in enumerate(lines):
-            if 'principio' in line.lower() and any(term in line.lower() for term in ['seguridad', 'legalidad', 'finalidad', 'proporcionalidad']):
+        for i in _topic_lines(parsed, _PRINCIPLE_TERMS_RE):
+            if _PRINCIPLE_NAMES_RE.search(parsed.lines_lower[i]):
                 # Extraer contexto del principio
-                principle_context = []
-                for j in range(i, min(i+3, len(lines))):
-                    if lines[j].strip():
-                        principle_context.append(lines[j].strip())
+                principle_context = [line for line in lines[i:i+3] if line]
                 
                 if principle_context:
                     principles.append(' '.join(principle_context))
@@ -2182,117 +2818,87 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if principles:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Principios de tratamiento según {doc_name}:**\n\n"
+            parts = [f"**Principios de tratamiento según {doc_name}:**\n\n"]
             
             for i, principle in enumerate(principles[:4], 1):
-                principle = re.sub(r'\s+', ' ', principle)
-                response += f"**{i}.** {principle[:1000]}...\n\n"
+                principle = _squeeze_head(principle, 1000)
+                parts.append(f"**{i}.** {principle}...\n\n")
             
-            response += "**🔐 Implicaciones para seguridad de la información:**\n"
-            response += "• **Principio de legalidad**: Base legal para el procesamiento\n"
-            response += "• **Principio de finalidad**: Limitación del uso de datos\n"
-            response += "• **Principio de proporcionalidad**: Minimización de datos\n"
-            response += "• **Principio de seguridad**: Protección técnica y organizacional\n"
+            parts.append(_PRINCIPLES_SECURITY_IMPLICATIONS)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré principios específicos de tratamiento en el documento consultado."
+        return _TOPIC_NO_INFO['principles']
     
     def _explain_data_protection_security_connection(self, user_query: str, sources: List[Dict]) -> str:
         """Explicar la conexión general entre protección de datos y seguridad"""
         
         doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa de protección de datos"
         
-        response = f"**¿Cómo se relaciona {doc_name} con seguridad de la información?**\n\n"
-        
-        response += "**🔗 Conexiones fundamentales:**\n\n"
-        
-        response += "**1. Control de acceso y autorización:**\n"
-        response += "• La autorización del titular equivale a un control de acceso\n"
-        response += "• Los derechos ARCO (Acceso, Rectificación, Cancelación, Oposición) son controles de datos\n\n"
-        
-        response += "**2. Clasificación y manejo de información:**\n"
-        response += "• Datos sensibles requieren controles adicionales de seguridad\n"
-        response += "• Datos públicos, semiprivados y privados tienen diferentes niveles de protección\n\n"
+        parts = [f"**¿Cómo se relaciona {doc_name} con seguridad de la información?**\n\n"]
         
-        response += "**3. Controles técnicos y organizacionales:**\n"
-        response += "• Políticas de tratamiento = Políticas de seguridad de datos\n"
-        response += "• Medidas de seguridad para impedir alteración, pérdida o acceso no autorizado\n\n"
+        parts.append(_SECURITY_CONNECTION_POINTS)
         
-        response += "**4. Auditoría y trazabilidad:**\n"
-        response += "• Registro de tratamientos y accesos\n"
-        response += "• Demostración de cumplimiento (accountability)\n\n"
+        parts.append(f"**📋 Para consultas específicas sobre {doc_name.lower()}:**\n")
+        parts.append(_SECURITY_FOLLOWUP_QUESTIONS)
         
-        response += "**5. Gestión de incidentes:**\n"
-        response += "• Notificación de violaciones de seguridad\n"
-        response += "• Procedimientos de respuesta ante incidentes\n\n"
-        
-        response += f"**📋 Para consultas específicas sobre {doc_name.lower()}:**\n"
-        response += "• ¿Cuáles son las obligaciones del responsable?\n"
-        response += "• ¿Qué medidas de seguridad se requieren?\n"
-        response += "• ¿Cómo manejar datos sensibles?\n"
-        response += "• ¿Qué hacer en caso de violación de datos?\n"
-        
-        return response
+        return ''.join(parts)
     
     def _extract_authorization_controls(self, context: str, sources: List[Dict]) -> str:
         """Extraer información sobre autorización como control de acceso"""
         
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['authorization'].search(context):
+            return _TOPIC_NO_INFO['authorization']
+        
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         auth_info = []
         
         # Buscar información sobre autorización
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['autorización', 'consentimiento', 'solicitar', 'obtener']):
-                if any(term in line_lower for term in ['titular', 'tratamiento', 'datos']):
-                    # Extraer contexto
-                    context_lines = []
-                    for j in range(max(0, i-1), min(len(lines), i+5)):
-                        if lines[j].strip():
-                            context_lines.append(lines[j].strip())
-                    
-                    if context_lines:
-                        section_text = ' '.join(context_lines)
-                        if len(section_text) > 100:
-                            auth_info.append(section_text)
-                            if len(auth_info) >= 2:
-                                break
+        for i in _topic_lines(parsed, _AUTHORIZATION_TERMS_RE):
+            if _AUTHORIZATION_SUBJECT_RE.search(parsed.lines_lower[i]):
+                # Extraer contexto
+                context_lines = [line for line in lines[max(0, i-1):i+5] if line]
+                
+                if context_lines:
+                    section_text = ' '.join(context_lines)
+                    if len(section_text) > 100:
+                        auth_info.append(section_text)
+                        if len(auth_info) >= 2:
+                            break
         
         if auth_info:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Obtención de autorización según {doc_name}:**\n\n"
+            parts = [f"**Obtención de autorización según {doc_name}:**\n\n"]
             
             for i, info in enumerate(auth_info, 1):
-                info = re.sub(r'\s+', ' ', info)
-                response += f"**{i}.** {info[:1500]}...\n\n"
+                info = _squeeze_head(info, 1500)
+                parts.append(f"**{i}.** {info}...\n\n")
             
-            response += "**🔐 Controles de seguridad relacionados:**\n"
-            response += "• **Control de acceso**: La autorización del titular funciona como control de acceso\n"
-            response += "• **Gestión de identidades**: Verificar identidad del titular antes de procesar\n"
-            response += "• **Registro de actividades**: Documentar autorizaciones otorgadas\n"
-            response += "• **Revisión periódica**: Verificar vigencia de autorizaciones\n"
+            parts.append(_AUTHORIZATION_SECURITY_CONTROLS)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre obtención de autorización en el documento."
+        return _TOPIC_NO_INFO['authorization']
     
     def _extract_policy_requirements(self, context: str, sources: List[Dict]) -> str:
         """Extraer requisitos de políticas de tratamiento"""
         
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['policy'].search(context):
+            return _TOPIC_NO_INFO['policy']
+        
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         policy_info = []
         
         # Buscar información sobre políticas
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['política', 'manual', 'procedimiento']) and 'tratamiento' in line_lower:
+        for i in _topic_lines(parsed, _POLICY_TERMS_RE):
+            if 'tratamiento' in parsed.lines_lower[i]:
                 # Extraer contexto
-                context_lines = []
-                for j in range(max(0, i-1), min(len(lines), i+8)):
-                    if lines[j].strip():
-                        context_lines.append(lines[j].strip())
+                context_lines = [line for line in lines[max(0, i-1):i+8] if line]
                 
                 if context_lines:
                     section_text = ' '.join(context_lines)
@@ -2304,37 +2910,35 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if policy_info:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Políticas de tratamiento según {doc_name}:**\n\n"
+            parts = [f"**Políticas de tratamiento según {doc_name}:**\n\n"]
             
             for i, info in enumerate(policy_info, 1):
-                info = re.sub(r'\s+', ' ', info)
-                response += f"**{i}.** {info[:1500]}...\n\n"
+                info = _squeeze_head(info, 1500)
+                parts.append(f"**{i}.** {info}...\n\n")
             
-            response += "**📋 Equivalencia con documentación de seguridad:**\n"
-            response += "• **Políticas de tratamiento** = Políticas de seguridad de datos\n"
-            response += "• **Procedimientos** = Procedimientos operativos estándar (SOP)\n"
-            response += "• **Manual interno** = Manual de seguridad de la información\n"
-            response += "• **Consultas y reclamos** = Gestión de incidentes de datos\n"
+            parts.append(_POLICY_SECURITY_EQUIVALENCES)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre políticas de tratamiento en el documento."
+        return _TOPIC_NO_INFO['policy']
     
     def _extract_data_subject_rights(self, context: str, sources: List[Dict]) -> str:
         """Extraer información sobre habeas data y derechos del titular"""
         
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['habeas_data'].search(context):
+            return _TOPIC_NO_INFO['habeas_data']
+        
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         rights_info = []
         
         # Buscar información sobre habeas data
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
+        for i in _topic_lines(parsed, _SUBJECT_RIGHTS_TERMS_RE):
+            line_lower = parsed.lines_lower[i]
             if 'habeas data' in line_lower or ('derecho' in line_lower and 'titular' in line_lower):
                 # Extraer contexto
-                context_lines = []
-                for j in range(max(0, i-1), min(len(lines), i+5)):
-                    if lines[j].strip():
-                        context_lines.append(lines[j].strip())
+                context_lines = [line for line in lines[max(0, i-1):i+5] if line]
                 
                 if context_lines:
                     section_text = ' '.join(context_lines)
@@ -2346,42 +2950,36 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if rights_info:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Habeas data y derechos del titular según {doc_name}:**\n\n"
+            parts = [f"**Habeas data y derechos del titular según {doc_name}:**\n\n"]
             
             for i, info in enumerate(rights_info, 1):
-                info = re.sub(r'\s+', ' ', info)
-                response += f"**{i}.** {info[:250]}...\n\n"
+                info = _squeeze_head(info, 250)
+                parts.append(f"**{i}.** {info}...\n\n")
             
-            response += "**🔐 Controles ARCO (Acceso, Rectificación, Cancelación, Oposición):**\n"
-            response += "• **Acceso**: Derecho a consultar qué datos se procesan\n"
-            response += "• **Rectificación**: Derecho a corregir datos inexactos\n"
-            response += "• **Cancelación**: Derecho a eliminar datos innecesarios\n"
-            response += "• **Oposición**: Derecho a objetar el procesamiento\n\n"
+            parts.append(_ARCO_CONTROLS)
             
-            response += "**📋 Implementación en SGSI:**\n"
-            response += "• Procedimientos de atención de solicitudes\n"
-            response += "• Registros de acceso a datos personales\n"
-            response += "• Controles de modificación y eliminación\n"
+            parts.append(_SGSI_RIGHTS_IMPLEMENTATION)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre habeas data en el documento."
+        return _TOPIC_NO_INFO['habeas_data']
     
     def _extract_transfer_controls(self, context: str, sources: List[Dict]) -> str:
         """Extraer información sobre transferencias internacionales"""
         
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['transfer'].search(context):
+            return _TOPIC_NO_INFO['transfer']
+        
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         transfer_info = []
         
         # Buscar información sobre transferencias
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['transferencia', 'transmisión']) and ('datos' in line_lower or 'internacional' in line_lower):
+        for i in _topic_lines(parsed, _TRANSFER_TERMS_RE):
+            if _TRANSFER_SUBJECT_RE.search(parsed.lines_lower[i]):
                 # Extraer contexto amplio
-                context_lines = []
-                for j in range(max(0, i-1), min(len(lines), i+6)):
-                    if lines[j].strip():
-                        context_lines.append(lines[j].strip())
+                context_lines = [line for line in lines[max(0, i-1):i+6] if line]
                 
                 if context_lines:
                     section_text = ' '.join(context_lines)
@@ -2393,62 +2991,54 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         if transfer_info:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Transferencias internacionales según {doc_name}:**\n\n"
+            parts = [f"**Transferencias internacionales según {doc_name}:**\n\n"]
             
             for i, info in enumerate(transfer_info, 1):
-                info = re.sub(r'\s+', ' ', info)
-                response += f"**{i}.** {info[:1500]}...\n\n"
+                info = _squeeze_head(info, 1500)
+                parts.append(f"**{i}.** {info}...\n\n")
             
-            response += "**🌐 Controles de transferencia internacional:**\n"
-            response += "• **Evaluación de destino**: Verificar nivel de protección del país receptor\n"
-            response += "• **Contratos de transferencia**: Cláusulas contractuales de protección\n"
-            response += "• **Autorización previa**: Consentimiento del titular para transferencia\n"
-            response += "• **Registro de transferencias**: Documentar todas las transferencias realizadas\n"
+            parts.append(_TRANSFER_CONTROLS)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre transferencias internacionales en el documento."
+        return _TOPIC_NO_INFO['transfer']
     
     def _extract_minors_data_protection(self, context: str, sources: List[Dict]) -> str:
         """Extraer información sobre protección de datos de menores"""
         
-        lines = context.split('\n')
+        # Prefiltro: sin ningún término del tema no hace falta dividir el contexto
+        if not _TOPIC_PREFILTER_RE['minors'].search(context):
+            return _TOPIC_NO_INFO['minors']
+        
+        parsed = self._parse_context(context)
+        lines = parsed.lines_clean
         minors_info = []
         
         # Buscar información sobre menores
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(term in line_lower for term in ['menores', 'niños', 'adolescentes']) or 'menor de edad' in line_lower:
-                # Extraer contexto amplio
-                context_lines = []
-                for j in range(max(0, i-2), min(len(lines), i+8)):
-                    if lines[j].strip():
-                        context_lines.append(lines[j].strip())
-                
-                if context_lines:
-                    section_text = ' '.join(context_lines)
-                    if len(section_text) > 150:
-                        minors_info.append(section_text)
-                        break
+        for i in _topic_lines(parsed, _MINORS_TERMS_RE):
+            # Extraer contexto amplio
+            context_lines = [line for line in lines[max(0, i-2):i+8] if line]
+            
+            if context_lines:
+                section_text = ' '.join(context_lines)
+                if len(section_text) > 150:
+                    minors_info.append(section_text)
+                    break
         
         if minors_info:
             doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa"
             
-            response = f"**Tratamiento de datos de menores según {doc_name}:**\n\n"
+            parts = [f"**Tratamiento de datos de menores según {doc_name}:**\n\n"]
             
             for info in minors_info:
-                info = re.sub(r'\s+', ' ', info)
-                response += f'"{info[:2000]}..."\n\n'
+                info = _squeeze_head(info, 2000)
+                parts.append(f'"{info}..."\n\n')
             
-            response += "**👶 Controles especiales para menores:**\n"
-            response += "• **Consentimiento parental**: Autorización del representante legal\n"
-            response += "• **Verificación de edad**: Controles para identificar menores\n"
-            response += "• **Interés superior**: Priorizar bienestar del menor\n"
-            response += "• **Limitaciones de uso**: Restricciones en el procesamiento\n"
+            parts.append(_MINORS_CONTROLS)
             
-            return response
+            return ''.join(parts)
         
-        return "No encontré información específica sobre tratamiento de datos de menores en el documento."
+        return _TOPIC_NO_INFO['minors']
     
     def _extract_surveillance_requirements(self, context: str, sources: List[Dict]) -> str:
         """Extraer información sobre videovigilancia"""
@@ -2456,32 +3046,5 @@ Genera una respuesta precisa basándote únicamente en la información proporcio
         # La videovigilancia generalmente no está en Ley 1581 básica, pero podemos inferir controles
         doc_name = f"{sources[0]['tipo_norma']} {sources[0]['numero']} de {sources[0]['año']}" if sources else "la normativa de protección de datos"
         
-        response = f"**Videovigilancia y {doc_name}:**\n\n"
-        
-        response += "**📹 Aplicación de principios de protección de datos:**\n\n"
-        
-        response += "**1. Finalidad específica:**\n"
-        response += "• La videovigilancia debe tener una finalidad legítima definida\n"
-        response += "• Seguridad de personas, bienes o instalaciones\n\n"
-        
-        response += "**2. Proporcionalidad:**\n"
-        response += "• Las cámaras solo deben capturar lo necesario\n"
-        response += "• Evitar espacios privados (baños, vestuarios)\n\n"
-        
-        response += "**3. Información al titular:**\n"
-        response += "• Avisos visibles de videovigilancia\n"
-        response += "• Identificación del responsable del tratamiento\n\n"
-        
-        response += "**4. Derechos del titular:**\n"
-        response += "• Derecho de acceso a las imágenes donde aparezca\n"
-        response += "• Derecho de supresión cuando no sean necesarias\n\n"
-        
-        response += "**🔐 Controles técnicos recomendados:**\n"
-        response += "• **Cifrado** de grabaciones almacenadas\n"
-        response += "• **Control de acceso** a sistemas de videovigilancia\n"
-        response += "• **Registro de accesos** a las grabaciones\n"
-        response += "• **Retención limitada** según finalidad\n"
-        
-        response += f"\n**📖 Fuente:** Aplicación de principios de {doc_name.lower()}"
-        
-        return response
\ No newline at end of file
+        return (f"**Videovigilancia y {doc_name}:**\n\n{_VIDEO_RESPONSE_BODY}"
+                f"\n**📖 Fuente:** Aplicación de principios de {doc_name.lower()}")
\ No newline at end of file
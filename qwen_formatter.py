@@ -8,49 +8,143 @@ Optimizado para documentos normativos colombianos usando Qwen real
 import os
 import json
 import re
+import asyncio
+import hashlib
+import threading
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
+from openai import OpenAI, AsyncOpenAI
 
-class QwenLegalFormatter:
-    def __init__(self, api_key: str = None, base_url: str = None, model: str = None):
-        """
-        Inicializar el formateador con Qwen real
-        """
-        # Cargar configuración de Qwen desde .env
-        qwen_env_path = "/Users/damo/Desktop/qwen-code-setup/.env"
-        if os.path.exists(qwen_env_path):
-            with open(qwen_env_path, 'r') as f:
-                for line in f:
-                    if line.strip() and not line.startswith('#'):
-                        key, value = line.strip().split('=', 1)
-                        os.environ[key] = value
-        
-        # Configuración de Qwen
-        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        self.base_url = base_url or os.getenv('OPENAI_BASE_URL', 'https://dashscope-intl.aliyuncs.com/compatible-mode/v1')
-        self.model = model or os.getenv('OPENAI_MODEL', 'qwen3-coder-plus')
-        
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY no encontrada. Configúrala en qwen-code-setup/.env")
-        
-        # Inicializar cliente OpenAI compatible con Qwen
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-        
-        # Configuración optimizada para análisis legal profundo
-        self.temperature = float(os.getenv('QWEN_TEMPERATURE', '0.1'))
-        self.max_tokens = int(os.getenv('QWEN_MAX_TOKENS', '30000'))  # Aumentado para documentos largos
-        
-    def format_and_extract_metadata(self, raw_text: str, document_title: str) -> Dict[str, Any]:
-        """
-        Formatear texto legal y extraer TODA la metadata usando Qwen
-        """
-        
-        # Prompt especializado para formateo legal colombiano Y extracción de metadata
-        system_prompt = """Eres un experto en análisis de documentos legales colombianos. Debes realizar DOS tareas:
+# orjson es opcional: más rápido para la metadata, con respaldo en json estándar
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# re2 (google-re2) es opcional: motor DFA en C++ para la regex por línea del formateo de respaldo
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+def _json_loads(data: str) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serializar a bytes UTF-8 (sin escapar caracteres no ASCII)
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+_QWEN_ENV_PATH = "/Users/damo/Desktop/qwen-code-setup/.env"
+
+# Patrones precompilados (se usan en cada documento procesado)
+_RE_JSON_FENCE_START = re.compile(r'^```json\s*')
+_RE_JSON_FENCE_END = re.compile(r'\s*```$')
+
+# Tipo de documento, en orden de prioridad. La palabra clave (en mayúsculas) es un filtro
+# previo barato para el encabezado: la regex solo se evalúa si la palabra aparece
+_DOC_TYPE_PATTERNS = (
+    ('ley', 'LEY', re.compile(r'\bLEY\b', re.IGNORECASE)),
+    ('decreto', 'DECRETO', re.compile(r'\bDECRETO\b', re.IGNORECASE)),
+    ('resolucion', 'RESOLUCI', re.compile(r'\bRESOLUCI[OÓ]N\b', re.IGNORECASE)),
+    ('circular', 'CIRCULAR', re.compile(r'\bCIRCULAR\b', re.IGNORECASE)),
+    ('conpes', 'CONPES', re.compile(r'\bCONPES\b', re.IGNORECASE)),
+)
+
+def _detect_doc_type(text: str, patterns=_DOC_TYPE_PATTERNS, prefilter: bool = True) -> Optional[str]:
+    """
+    Primer tipo (en orden de prioridad) presente en el texto, o None. Sin prefiltro para
+    textos largos: copiar el documento completo en mayúsculas cuesta más que las regex,
+    que se detienen en la primera coincidencia
+    """
+    upper = text.upper() if prefilter else None
+    for doc_type, keyword, pattern in patterns:
+        if (upper is None or keyword in upper) and pattern.search(text):
+            return doc_type
+    return None
+
+_RE_DOCNUM = re.compile(r'(?:LEY|DECRETO|RESOLUCI[OÓ]N|CIRCULAR|CONPES)\s*(?:N[°º]?\s*)?(\d+)', re.IGNORECASE)
+_RE_DOCNUM_YEAR = re.compile(r'(?:LEY|DECRETO|RESOLUCI[OÓ]N)\s*(?:N[°º]?\s*)?(\d+)\s*(?:DE|DEL)?\s*(\d{4})?', re.IGNORECASE)
+_RE_YEAR = re.compile(r'\b(19\d{2}|20\d{2})\b')
+_RE_ARTICULO_MENTION = re.compile(r'Art[íi]culo\s+\d+', re.IGNORECASE)
+_RE_ARTICULO = re.compile(r'Art[íi]culo\s+(\d+)', re.IGNORECASE)
+_RE_DEROGA = re.compile(r'(?:deroga|deróguese|derógase)\s+(?:el\s+)?(?:artículo|decreto|ley)\s+(\d+)', re.IGNORECASE)
+
+# Post-procesamiento del HTML
+_RE_BLANK_LINES = re.compile(r'\n\s*\n')
+_RE_EMPTY_P = re.compile(r'<p>\s*</p>')
+_RE_ARTICLE_OPEN = re.compile(r'<article([^>]*)>')
+
+# Metadata web que se elimina antes de enviar el texto a Qwen. Cada regla se edita por
+# separado, pero se aplican todas juntas como una sola alternancia (un recorrido del texto)
+_WEB_JUNK_PATTERNS = (
+    r'Descargar PDF.*?\n',
+    r'Fecha[s]?\s*(?:de\s*)?(?:Expedición|Entrada|Vigencia)?:.*?\n',
+    r'Medio de Publicación:.*?\n',
+    r'Diario Oficial.*?\n',
+    r'Temas?\s*\(\d+\).*?\n',
+    r'DATOS PERSONALES.*?\n',
+    r'- Subtema:.*?\n',
+    r'RÉGIMEN ESPECIAL.*?\n',
+    r'Superintendencia.*?\n',
+    r'Vigencias?\s*\(\d+\).*?\n',
+    r'Los datos publicados.*?\n',
+    r'Gestor Normativo.*?\n',
+    r'Función Pública.*?\n',
+    r'Inicio\s+Conc\s+Normas.*?\n',
+    r'- Parte \d+.*?\n',
+    r'^\s*-\s*$\n'  # Líneas con solo guiones
+)
+_RE_WEB_JUNK = re.compile('|'.join(_WEB_JUNK_PATTERNS), re.IGNORECASE | re.MULTILINE)
+_RE_EXTRA_BLANK_LINES = re.compile(r'\n\s*\n\s*\n')
+
+# Encabezados reconocidos por el formateo de respaldo: una sola regex por línea y el
+# tipo sale de m.lastgroup (las alternativas van en el mismo orden de prioridad).
+# Es compatible con re2 (grupos con nombre, sin referencias hacia atrás); como en re2
+# \s solo cubre ASCII, el espacio no separable se agrega explícitamente
+_LINE_PATTERN = (
+    r'(?P<ley>(?:LEY|DECRETO|RESOLUCI[ÓO]N|CIRCULAR|CONPES).*\d{4})'
+    r'|(?P<titulo>T[ÍI]TULO[\s\xa0]+[IVXLC]+)'
+    r'|(?P<cap>CAP[ÍI]TULO[\s\xa0]+[IVXLC]+)'
+    r'|(?P<art>Art[íi]culo[\s\xa0]+(?P<art_num>\d+))'
+    r'|(?P<par>PAR[ÁA]GRAFO)'
+)
+
+def _compile_line_pattern(pattern: str):
+    """
+    Compilar con re2 si está instalado y se comporta como google-re2; si no, con re
+    """
+    if RE2_AVAILABLE:
+        # Otras distribuciones de 're2' no tienen Options o no exponen lastgroup: cualquier
+        # fallo al compilar o en la verificación rápida deja el patrón en re
+        try:
+            options = re2.Options()
+            options.case_sensitive = False
+            options.max_mem = 8 << 20
+            compiled = re2.compile(pattern, options=options)
+            probe = compiled.match('ARTÍCULO 5')
+            if probe and probe.lastgroup == 'art' and probe.group('art_num') == '5':
+                return compiled
+        except Exception:
+            pass
+    return re.compile(pattern, re.IGNORECASE)
+
+_RE_LINE = _compile_line_pattern(_LINE_PATTERN)
+
+# Prompt especializado para formateo legal colombiano Y extracción de metadata. Es fijo
+# (el título y el texto van en el mensaje del usuario) para que el prefijo sea idéntico
+# en todas las solicitudes y el proveedor pueda reutilizar su cache de prompts
+_SYSTEM_PROMPT = """Eres un experto en análisis de documentos legales colombianos. Debes realizar DOS tareas:
 
 ## TAREA 1: EXTRACCIÓN DE METADATA COMPLETA
 
@@ -139,9 +233,147 @@ RESPONDE con:
 [HTML formateado]
 """
 
+@lru_cache(maxsize=1)
+def _load_qwen_env() -> Dict[str, str]:
+    """
+    Cargar la configuración de Qwen desde .env una sola vez por proceso
+    """
+    env = {}
+    if os.path.exists(_QWEN_ENV_PATH):
+        with open(_QWEN_ENV_PATH, 'r') as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    key, value = line.strip().split('=', 1)
+                    env[key] = value
+        os.environ.update(env)
+    return env
+
+class QwenLegalFormatter:
+    def __init__(self, api_key: str = None, base_url: str = None, model: str = None):
+        """
+        Inicializar el formateador con Qwen real
+        """
+        # Cargar configuración de Qwen desde .env (leído una vez por proceso)
+        _load_qwen_env()
+        
+        # Configuración de Qwen
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL', 'https://dashscope-intl.aliyuncs.com/compatible-mode/v1')
+        self.model = model or os.getenv('OPENAI_MODEL', 'qwen3-coder-plus')
+        
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY no encontrada. Configúrala en qwen-code-setup/.env")
+        
+        # Inicializar cliente OpenAI compatible con Qwen
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url
+        )
+        
+        # Configuración optimizada para análisis legal profundo
+        self.temperature = float(os.getenv('QWEN_TEMPERATURE', '0.1'))
+        self.max_tokens = int(os.getenv('QWEN_MAX_TOKENS', '30000'))  # Aumentado para documentos largos
+        
+        # Cache en disco de respuestas de Qwen (opcional: solo si QWEN_CACHE_DIR está definido)
+        self.cache_dir = os.getenv('QWEN_CACHE_DIR') or None
+        self.cache_max_entries = int(os.getenv('QWEN_CACHE_MAX_ENTRIES', '500'))
+        # Recibir la respuesta por streaming (opcional; respuestas de hasta max_tokens tokens)
+        self.stream = os.getenv('QWEN_STREAM', '').lower() in ('1', 'true', 'yes')
+        # Marcar el prompt de sistema para cache explícita (DashScope, cache_control)
+        self.explicit_prompt_cache = os.getenv('QWEN_EXPLICIT_PROMPT_CACHE', '').lower() in ('1', 'true', 'yes')
+        
+    def format_and_extract_metadata(self, raw_text: str, document_title: str) -> Dict[str, Any]:
+        """
+        Formatear texto legal y extraer TODA la metadata usando Qwen
+        """
         # Limpiar texto antes de procesar
         clean_text = self._pre_clean_text(raw_text)
         
+        try:
+            params, cache_key, response = self._prepare_request(clean_text, document_title)
+            from_cache = response is not None
+            if not from_cache:
+                # Llamada a Qwen con prompts mejorados
+                response = self._request_completion(params)
+            return self._complete_result(response, from_cache, cache_key, raw_text, clean_text)
+            
+        except Exception as e:
+            return self._fallback_result(e, raw_text)
+    
+    async def format_batch(self, docs: List[Tuple[str, str]], max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Formatear varios documentos (título, texto) con llamadas concurrentes a Qwen
+        """
+        # Limitar las solicitudes simultáneas para respetar los límites del proveedor
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Cliente asíncrono ligado a este event loop; se cierra al terminar el lote
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) as aclient:
+            return await asyncio.gather(*(
+                self._format_one(aclient, raw_text, document_title, semaphore) for document_title, raw_text in docs
+            ))
+    
+    async def _format_one(self, aclient: AsyncOpenAI, raw_text: str, document_title: str,
+                          semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """
+        Versión asíncrona de format_and_extract_metadata (mismo prompt y mismo resultado).
+        El trabajo de CPU y de disco va a un hilo para no bloquear el event loop
+        """
+        clean_text = await asyncio.to_thread(self._pre_clean_text, raw_text)
+        
+        try:
+            params, cache_key, response = await asyncio.to_thread(self._prepare_request, clean_text, document_title)
+            from_cache = response is not None
+            if not from_cache:
+                async with semaphore:
+                    response = await self._request_completion_async(aclient, params)
+            return await asyncio.to_thread(self._complete_result, response, from_cache, cache_key, raw_text, clean_text)
+            
+        except Exception as e:
+            return await asyncio.to_thread(self._fallback_result, e, raw_text)
+    
+    def _prepare_request(self, clean_text: str, document_title: str) -> Tuple[Dict[str, Any], Optional[str], Optional[str]]:
+        """
+        Parámetros de la solicitud, clave de cache y respuesta guardada (None si no hay)
+        """
+        params = self._completion_params(clean_text, document_title)
+        cache_key = self._cache_key(params)
+        return params, cache_key, self._cache_get(cache_key)
+    
+    def _request_completion(self, params: Dict[str, Any]) -> str:
+        """
+        Texto de la respuesta de Qwen
+        """
+        if self.stream:
+            stream = self.client.chat.completions.create(**params, stream=True)
+            return self._stream_text(list(stream))
+        chat_completion = self.client.chat.completions.create(**params)
+        return chat_completion.choices[0].message.content
+    
+    async def _request_completion_async(self, aclient: AsyncOpenAI, params: Dict[str, Any]) -> str:
+        """
+        Texto de la respuesta de Qwen (versión asíncrona)
+        """
+        if self.stream:
+            stream = await aclient.chat.completions.create(**params, stream=True)
+            return self._stream_text([chunk async for chunk in stream])
+        chat_completion = await aclient.chat.completions.create(**params)
+        return chat_completion.choices[0].message.content
+    
+    def _complete_result(self, response: str, from_cache: bool, cache_key: Optional[str],
+                         raw_text: str, clean_text: str) -> Dict[str, Any]:
+        """
+        Resultado final a partir de la respuesta; solo se guarda en cache si se pudo procesar.
+        El parseo, post-proceso y validación corren siempre con el código actual
+        """
+        result = self._build_result(response, raw_text, clean_text)
+        if not from_cache:
+            self._cache_put(cache_key, response)
+        return result
+    
+    def _completion_params(self, clean_text: str, document_title: str) -> Dict[str, Any]:
+        """
+        Parámetros de la solicitud a Qwen para un documento
+        """
         user_prompt = f"""
 DOCUMENTO: {document_title}
 
@@ -151,44 +383,138 @@ TEXTO COMPLETO A ANALIZAR:
 Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTML limpio.
 """
 
+        return {
+            'messages': [
+                self._system_message(),
+                {"role": "user", "content": user_prompt}
+            ],
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature
+        }
+    
+    @staticmethod
+    def _stream_text(chunks: List[Any]) -> str:
+        """
+        Texto completo de una respuesta por streaming. Un stream que termina sin
+        finish_reason quedó cortado: se trata como error (respaldo, sin guardar en cache)
+        """
+        if not any(chunk.choices and chunk.choices[0].finish_reason for chunk in chunks):
+            raise RuntimeError("Respuesta de Qwen incompleta: el streaming terminó sin finish_reason")
+        return ''.join(chunk.choices[0].delta.content for chunk in chunks
+                       if chunk.choices and chunk.choices[0].delta.content)
+    
+    def _system_message(self) -> Dict[str, Any]:
+        """
+        Mensaje de sistema; el caching implícito del proveedor aplica igual sin marca
+        """
+        if self.explicit_prompt_cache:
+            return {"role": "system", "content": [
+                {"type": "text", "text": _SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+            ]}
+        return {"role": "system", "content": _SYSTEM_PROMPT}
+    
+    def _build_result(self, response: str, raw_text: str, clean_text: str) -> Dict[str, Any]:
+        """
+        Convertir la respuesta de Qwen en el resultado final
+        """
+        # Parsear respuesta
+        metadata, html = self._parse_qwen_response(response)
+        
+        # Post-procesamiento
+        html = self._post_process_html(html)
+        
+        # Validar metadata
+        metadata = self._validate_metadata(metadata, clean_text)
+        
+        return {
+            'success': True,
+            'metadata': metadata,
+            'formatted_html': html,
+            'word_count': len(raw_text.split()),
+            'article_count': len(metadata.get('estructura', {}).get('articulos', []))
+        }
+    
+    def _fallback_result(self, error: Exception, raw_text: str) -> Dict[str, Any]:
+        """
+        Resultado de respaldo cuando la llamada a Qwen falla
+        """
+        return {
+            'success': False,
+            'error': str(error),
+            'fallback_html': self._basic_fallback_format(raw_text),
+            'metadata': self._extract_basic_metadata(raw_text)
+        }
+    
+    def _cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        """
+        Clave de cache: sha256 de la solicitud completa (prompts con título y texto, modelo,
+        temperatura y max_tokens). None si la cache está desactivada
+        """
+        if not self.cache_dir:
+            return None
+        request = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+    
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        """
+        Respuesta cruda guardada para la clave, o None si no existe o no se puede leer
+        """
+        if key is None:
+            return None
         try:
-            # Llamada a Qwen con prompts mejorados
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
-            
-            response = chat_completion.choices[0].message.content
-            
-            # Parsear respuesta
-            metadata, html = self._parse_qwen_response(response)
-            
-            # Post-procesamiento
-            html = self._post_process_html(html)
-            
-            # Validar metadata
-            metadata = self._validate_metadata(metadata, clean_text)
-            
-            return {
-                'success': True,
-                'metadata': metadata,
-                'formatted_html': html,
-                'word_count': len(raw_text.split()),
-                'article_count': len(metadata.get('estructura', {}).get('articulos', []))
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'fallback_html': self._basic_fallback_format(raw_text),
-                'metadata': self._extract_basic_metadata(raw_text)
-            }
+            with open(self._cache_path(key), 'rb') as f:
+                response = _json_loads(f.read())['response']
+            return response if isinstance(response, str) else None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _cache_put(self, key: Optional[str], response: str) -> None:
+        """
+        Guardar la respuesta cruda de forma atómica (archivo temporal + rename)
+        """
+        if key is None:
+            return
+        path = self._cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(_json_dumps({'response': response}))
+            os.replace(tmp_path, path)
+            self._cache_evict()
+        except OSError:
+            # La cache es opcional: un fallo de escritura no afecta el resultado
+            pass
+    
+    def _cache_evict(self) -> None:
+        """
+        Eliminar las entradas más antiguas si la cache supera el máximo
+        """
+        entries = [entry for entry in os.scandir(self.cache_dir)
+                   if entry.is_file() and entry.name.endswith('.json')]
+        if len(entries) <= self.cache_max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.cache_max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def invalidate(self, key: str) -> None:
+        """
+        Eliminar una entrada de la cache (clave obtenida con _cache_key)
+        """
+        if not self.cache_dir or key is None:
+            return
+        try:
+            os.remove(self._cache_path(key))
+        except FileNotFoundError:
+            pass
     
     def _parse_qwen_response(self, response: str) -> Tuple[Dict, str]:
         """
@@ -209,9 +535,9 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
                     # Parsear JSON
                     try:
                         # Limpiar el JSON de posibles caracteres extra
-                        metadata_str = re.sub(r'^```json\s*', '', metadata_str)
-                        metadata_str = re.sub(r'\s*```$', '', metadata_str)
-                        metadata = json.loads(metadata_str)
+                        metadata_str = _RE_JSON_FENCE_START.sub('', metadata_str)
+                        metadata_str = _RE_JSON_FENCE_END.sub('', metadata_str)
+                        metadata = _json_loads(metadata_str)
                     except:
                         metadata = {}
         
@@ -237,33 +563,27 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
         
         # Detectar tipo si no está
         if not meta.get('tipo'):
-            if re.search(r'\bLEY\b', text, re.IGNORECASE):
-                meta['tipo'] = 'ley'
-            elif re.search(r'\bDECRETO\b', text, re.IGNORECASE):
-                meta['tipo'] = 'decreto'
-            elif re.search(r'\bRESOLUCI[OÓ]N\b', text, re.IGNORECASE):
-                meta['tipo'] = 'resolucion'
-            elif re.search(r'\bCIRCULAR\b', text, re.IGNORECASE):
-                meta['tipo'] = 'circular'
-            elif re.search(r'\bCONPES\b', text, re.IGNORECASE):
-                meta['tipo'] = 'conpes'
+            # El encabezado casi siempre indica el tipo; el texto completo solo si no aparece ahí
+            doc_type = _detect_doc_type(text[:200]) or _detect_doc_type(text, prefilter=False)
+            if doc_type:
+                meta['tipo'] = doc_type
         
         # Extraer número si falta
         if not meta.get('numero'):
-            num_match = re.search(r'(?:LEY|DECRETO|RESOLUCI[OÓ]N|CIRCULAR|CONPES)\s*(?:N[°º]?\s*)?(\d+)', text, re.IGNORECASE)
+            num_match = _RE_DOCNUM.search(text)
             if num_match:
                 meta['numero'] = num_match.group(1)
         
         # Extraer año si falta
         if not meta.get('año'):
-            year_match = re.search(r'\b(19\d{2}|20\d{2})\b', text)
+            year_match = _RE_YEAR.search(text)
             if year_match:
                 meta['año'] = year_match.group(1)
         
         # Contar artículos si falta
         if not metadata['estructura'].get('total_articulos'):
-            articulos = re.findall(r'Art[íi]culo\s+\d+', text, re.IGNORECASE)
-            metadata['estructura']['total_articulos'] = len(set(articulos))
+            articulos = {m.group(0) for m in _RE_ARTICULO_MENTION.finditer(text)}
+            metadata['estructura']['total_articulos'] = len(articulos)
         
         return metadata
     
@@ -272,21 +592,38 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
         Post-procesamiento para mejorar el HTML generado
         """
         # Limpiar HTML mal formado
-        html = re.sub(r'\n\s*\n', '\n', html)
-        html = re.sub(r'<p>\s*</p>', '', html)
-        
-        # Asegurar estructura de artículos
-        def fix_article_structure(match):
-            content = match.group(0)
+        html = _RE_BLANK_LINES.sub('\n', html)
+        html = _RE_EMPTY_P.sub('', html)
+        
+        # Asegurar estructura de artículos: cada bloque va desde <article ...> hasta el
+        # primer </article>; se recorre una sola vez y solo se reescribe la etiqueta de apertura
+        parts = []
+        pos = 0
+        for match in _RE_ARTICLE_OPEN.finditer(html):
+            start = match.start()
+            if start < pos:
+                continue  # Apertura dentro de un bloque ya procesado
+            close = html.find('</article>', match.end())
+            if close == -1:
+                break
+            end = close + len('</article>')
+            
             # Extraer número del artículo
-            num_match = re.search(r'Art[íi]culo\s+(\d+)', content, re.IGNORECASE)
-            if num_match:
+            num_match = _RE_ARTICULO.search(html, start, end)
+            if num_match and html.find('id=', start, end) == -1:
                 num = num_match.group(1)
-                if 'id=' not in content:
-                    content = re.sub(r'<article([^>]*)>', f'<article\\1 id="art-{num}" data-numero="{num}">', content)
-            return content
-        
-        html = re.sub(r'<article[^>]*>.*?</article>', fix_article_structure, html, flags=re.DOTALL)
+                parts.append(html[pos:start])
+                if html.find('<article', match.end(), end) == -1:
+                    parts.append(f'<article{match.group(1)} id="art-{num}" data-numero="{num}">')
+                    parts.append(html[match.end():end])
+                else:
+                    # Bloque con aperturas anidadas: todas reciben el mismo número
+                    parts.append(_RE_ARTICLE_OPEN.sub(f'<article\\1 id="art-{num}" data-numero="{num}">', html[start:end]))
+            else:
+                parts.append(html[pos:end])
+            pos = end
+        parts.append(html[pos:])
+        html = ''.join(parts)
         
         return html.strip()
     
@@ -300,27 +637,24 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
             'referencias_cruzadas': {}
         }
         
-        # Tipo de documento
-        if re.search(r'\bLEY\b', text[:200], re.IGNORECASE):
-            metadata['metadata']['tipo'] = 'ley'
-        elif re.search(r'\bDECRETO\b', text[:200], re.IGNORECASE):
-            metadata['metadata']['tipo'] = 'decreto'
-        elif re.search(r'\bRESOLUCI[OÓ]N\b', text[:200], re.IGNORECASE):
-            metadata['metadata']['tipo'] = 'resolucion'
+        # Tipo de documento (solo ley, decreto o resolución en el encabezado)
+        doc_type = _detect_doc_type(text[:200], _DOC_TYPE_PATTERNS[:3])
+        if doc_type:
+            metadata['metadata']['tipo'] = doc_type
         
         # Número y año
-        num_match = re.search(r'(?:LEY|DECRETO|RESOLUCI[OÓ]N)\s*(?:N[°º]?\s*)?(\d+)\s*(?:DE|DEL)?\s*(\d{4})?', text[:500], re.IGNORECASE)
+        num_match = _RE_DOCNUM_YEAR.search(text[:500])
         if num_match:
             metadata['metadata']['numero'] = num_match.group(1)
             if num_match.group(2):
                 metadata['metadata']['año'] = num_match.group(2)
         
         # Contar artículos
-        articulos = re.findall(r'Art[íi]culo\s+(\d+)', text, re.IGNORECASE)
-        metadata['estructura']['total_articulos'] = len(set(articulos))
+        articulos = {m.group(1) for m in _RE_ARTICULO.finditer(text)}
+        metadata['estructura']['total_articulos'] = len(articulos)
         
         # Referencias básicas
-        derogaciones = re.findall(r'(?:deroga|deróguese|derógase)\s+(?:el\s+)?(?:artículo|decreto|ley)\s+(\d+)', text, re.IGNORECASE)
+        derogaciones = _RE_DEROGA.findall(text)
         if derogaciones:
             metadata['referencias_cruzadas']['normas_derogadas'] = list(set(derogaciones))
         
@@ -331,30 +665,10 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
         Limpiar texto antes de enviar a Qwen
         """
         # Remover metadata web común
-        cleanup_patterns = [
-            r'Descargar PDF.*?\n',
-            r'Fecha[s]?\s*(?:de\s*)?(?:Expedición|Entrada|Vigencia)?:.*?\n',
-            r'Medio de Publicación:.*?\n',
-            r'Diario Oficial.*?\n',
-            r'Temas?\s*\(\d+\).*?\n',
-            r'DATOS PERSONALES.*?\n',
-            r'- Subtema:.*?\n',
-            r'RÉGIMEN ESPECIAL.*?\n',
-            r'Superintendencia.*?\n',
-            r'Vigencias?\s*\(\d+\).*?\n',
-            r'Los datos publicados.*?\n',
-            r'Gestor Normativo.*?\n',
-            r'Función Pública.*?\n',
-            r'Inicio\s+Conc\s+Normas.*?\n',
-            r'- Parte \d+.*?\n',
-            r'^\s*-\s*$\n'  # Líneas con solo guiones
-        ]
-        
-        for pattern in cleanup_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+        text = _RE_WEB_JUNK.sub('', text)
         
         # Limpiar múltiples líneas vacías
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+        text = _RE_EXTRA_BLANK_LINES.sub('\n\n', text)
         
         # Eliminar espacios al inicio y final
         text = text.strip()
@@ -367,6 +681,8 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
         """
         lines = text.split('\n')
         html_lines = ['<div class="documento-legal">']
+        # Las f-strings ya son la forma más rápida de envolver cada línea
+        append = html_lines.append
         in_article = False
         current_article_num = None
         
@@ -374,54 +690,70 @@ Realiza el análisis completo: extrae TODA la metadata en JSON y formatea el HTM
             line = line.strip()
             if not line:
                 if in_article:
-                    html_lines.append('</article>')
+                    append('</article>')
                     in_article = False
                 continue
             
+            match = _RE_LINE.match(line)
+            kind = match.lastgroup if match else None
+            
             # Título principal
-            if re.match(r'^(?:LEY|DECRETO|RESOLUCI[ÓO]N|CIRCULAR|CONPES).*\d{4}', line, re.IGNORECASE):
-                html_lines.append(f'<h1>{line}</h1>')
+            if kind == 'ley':
+                append(f'<h1>{line}</h1>')
             
             # Títulos y capítulos
-            elif re.match(r'^T[ÍI]TULO\s+[IVXLC]+', line, re.IGNORECASE):
+            elif kind == 'titulo' or kind == 'cap':
                 if in_article:
-                    html_lines.append('</article>')
+                    append('</article>')
                     in_article = False
-                html_lines.append(f'<h2>{line}</h2>')
+                append(f'<h2>{line}</h2>')
             
-            elif re.match(r'^CAP[ÍI]TULO\s+[IVXLC]+', line, re.IGNORECASE):
+            # Artículos (el número ya viene capturado)
+            elif kind == 'art':
                 if in_article:
-                    html_lines.append('</article>')
-                    in_article = False
-                html_lines.append(f'<h2>{line}</h2>')
-            
-            # Artículos
-            elif re.match(r'^Art[íi]culo\s+\d+', line, re.IGNORECASE):
-                if in_article:
-                    html_lines.append('</article>')
+                    append('</article>')
                 
-                article_match = re.search(r'(\d+)', line)
-                if article_match:
-                    current_article_num = article_match.group(1)
-                    html_lines.append(f'<article class="articulo" id="art-{current_article_num}" data-numero="{current_article_num}">')
-                    html_lines.append(f'<h3>{line}</h3>')
-                    in_article = True
+                current_article_num = match.group('art_num')
+                append(f'<article class="articulo" id="art-{current_article_num}" data-numero="{current_article_num}">')
+                append(f'<h3>{line}</h3>')
+                in_article = True
             
             # Parágrafos
-            elif re.match(r'^PAR[ÁA]GRAFO', line, re.IGNORECASE):
-                html_lines.append(f'<div class="paragrafo"><h4>{line}</h4>')
+            elif kind == 'par':
+                append(f'<div class="paragrafo"><h4>{line}</h4>')
             
             # Contenido normal
             else:
-                html_lines.append(f'<p>{line}</p>')
+                append(f'<p>{line}</p>')
         
         if in_article:
-            html_lines.append('</article>')
+            append('</article>')
         
-        html_lines.append('</div>')
+        append('</div>')
         
         return '\n'.join(html_lines)
 
+def _document_title(filename: str) -> str:
+    """
+    Título legible a partir del nombre del archivo
+    """
+    return filename.replace('.txt', '').replace('_', ' ').title()
+
+def _save_outputs(result: Dict[str, Any], filename: str, output_dir: str) -> None:
+    """
+    Guardar metadata y HTML de un resultado exitoso
+    """
+    # Guardar metadata
+    metadata_file = os.path.join(output_dir, f"{filename}_metadata.json")
+    Path(metadata_file).write_bytes(_json_dumps(result['metadata'], indent=True))
+    
+    # Guardar HTML formateado (un solo write con el contenido completo)
+    html_file = os.path.join(output_dir, f"{filename}_formatted.html")
+    Path(html_file).write_bytes(result['formatted_html'].encode('utf-8'))
+    
+    result['metadata_file'] = metadata_file
+    result['html_file'] = html_file
+
 def process_document_with_qwen(file_path: str, output_dir: str = None) -> Dict[str, Any]:
     """
     Procesar un documento completo con Qwen
@@ -434,27 +766,38 @@ def process_document_with_qwen(file_path: str, output_dir: str = None) -> Dict[s
     
     # Obtener título del archivo
     filename = os.path.basename(file_path)
-    document_title = filename.replace('.txt', '').replace('_', ' ').title()
+    document_title = _document_title(filename)
     
     # Procesar con Qwen
     result = formatter.format_and_extract_metadata(text, document_title)
     
     if result['success'] and output_dir:
-        # Guardar metadata
-        metadata_file = os.path.join(output_dir, f"{filename}_metadata.json")
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(result['metadata'], f, ensure_ascii=False, indent=2)
-        
-        # Guardar HTML formateado
-        html_file = os.path.join(output_dir, f"{filename}_formatted.html")
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(result['formatted_html'])
-        
-        result['metadata_file'] = metadata_file
-        result['html_file'] = html_file
+        _save_outputs(result, filename, output_dir)
     
     return result
 
+def process_documents_with_qwen(file_paths: List[str], output_dir: str = None,
+                                max_concurrency: int = 8) -> List[Dict[str, Any]]:
+    """
+    Procesar varios documentos con solicitudes concurrentes a Qwen (un resultado por archivo)
+    """
+    formatter = QwenLegalFormatter()
+    
+    filenames = [os.path.basename(file_path) for file_path in file_paths]
+    docs = []
+    for file_path, filename in zip(file_paths, filenames):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            docs.append((_document_title(filename), f.read()))
+    
+    results = asyncio.run(formatter.format_batch(docs, max_concurrency))
+    
+    if output_dir:
+        for result, filename in zip(results, filenames):
+            if result['success']:
+                _save_outputs(result, filename, output_dir)
+    
+    return results
+
 if __name__ == "__main__":
     # Test con un archivo
     import sys
@@ -463,6 +806,16 @@ if __name__ == "__main__":
         file_path = sys.argv[1]
         output_dir = sys.argv[2] if len(sys.argv) > 2 else "."
         
+        # Directorio: procesar todos los .txt en paralelo
+        if os.path.isdir(file_path):
+            file_paths = sorted(os.path.join(file_path, name) for name in os.listdir(file_path) if name.endswith('.txt'))
+            print(f"Procesando {len(file_paths)} documentos de {file_path} con Qwen...")
+            results = process_documents_with_qwen(file_paths, output_dir)
+            for path, result in zip(file_paths, results):
+                status = f"✅ {result['article_count']} artículos" if result['success'] else f"❌ {result['error']}"
+                print(f"   - {os.path.basename(path)}: {status}")
+            sys.exit(0)
+        
         print(f"Procesando {file_path} con Qwen...")
         result = process_document_with_qwen(file_path, output_dir)
         
@@ -7,19 +7,20 @@ import os
 import sys
 import subprocess
 import time
+from importlib.util import find_spec
+
+# Packages the server needs; found via find_spec so they are not imported here
+REQUIRED_MODULES = ("flask", "flask_cors", "sqlite3")
 
 def check_dependencies():
     """Check if required packages are installed"""
-    try:
-        import flask
-        import flask_cors
-        import sqlite3
+    missing = [name for name in REQUIRED_MODULES if find_spec(name) is None]
+    if not missing:
         print("✅ Dependencies check passed")
         return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
-        print("💡 Install with: pip install -r requirements.txt")
-        return False
+    print(f"❌ Missing dependency: {', '.join(missing)}")
+    print("💡 Install with: pip install -r requirements.txt")
+    return False
 
 def check_database():
     """Check if database exists"""
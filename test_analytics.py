@@ -7,15 +7,30 @@ import requests
 import time
 import random
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "http://localhost:5002"
 ADMIN_TOKEN = "admin_daniel_2024"
 
+def fetch_all(session, endpoints, **kwargs):
+    """GET independent endpoints concurrently; returns (endpoint, response or exception) in order"""
+    def fetch(endpoint):
+        try:
+            return session.get(f"{BASE_URL}{endpoint}", **kwargs)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        return list(zip(endpoints, executor.map(fetch, endpoints)))
+
 def test_endpoints():
     """Simulate user activity to generate analytics data"""
     
     print("🧪 Testing Analytics System...")
     
+    # One session for the whole run: connections to the server are reused
+    session = requests.Session()
+    
     # Test basic endpoints
     endpoints_to_test = [
         "/api/test",
@@ -23,12 +38,11 @@ def test_endpoints():
         "/api/stats"
     ]
     
-    for endpoint in endpoints_to_test:
-        try:
-            response = requests.get(f"{BASE_URL}{endpoint}")
+    for endpoint, response in fetch_all(session, endpoints_to_test):
+        if isinstance(response, Exception):
+            print(f"❌ {endpoint}: Error - {response}")
+        else:
             print(f"✅ {endpoint}: {response.status_code}")
-        except Exception as e:
-            print(f"❌ {endpoint}: Error - {e}")
     
     # Test chat endpoint with different queries
     chat_queries = [
@@ -42,7 +56,7 @@ def test_endpoints():
     print("\n🤖 Testing Chat Queries...")
     for query in chat_queries:
         try:
-            response = requests.post(f"{BASE_URL}/api/chat", 
+            response = session.post(f"{BASE_URL}/api/chat", 
                 json={"query": query})
             print(f"✅ Chat query: {response.status_code}")
             time.sleep(1)  # Simulate real user behavior
@@ -53,7 +67,7 @@ def test_endpoints():
     print("\n📄 Testing Document Access...")
     try:
         # Get list of documents first
-        docs_response = requests.get(f"{BASE_URL}/api/documents")
+        docs_response = session.get(f"{BASE_URL}/api/documents")
         if docs_response.status_code == 200:
             docs_data = docs_response.json()
             if docs_data.get('success') and docs_data.get('data'):
@@ -62,7 +76,7 @@ def test_endpoints():
                 for doc in documents:
                     doc_id = doc.get('nombre_archivo')
                     if doc_id:
-                        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/content")
+                        response = session.get(f"{BASE_URL}/api/documents/{doc_id}/content")
                         print(f"✅ Document access {doc_id}: {response.status_code}")
                         time.sleep(0.5)
     except Exception as e:
@@ -82,9 +96,10 @@ def test_endpoints():
         "/api/admin/analytics/realtime"
     ]
     
-    for endpoint in admin_endpoints:
+    for endpoint, response in fetch_all(session, admin_endpoints, params={"hours": 24}, headers=headers):
         try:
-            response = requests.get(f"{BASE_URL}{endpoint}?hours=24", headers=headers)
+            if isinstance(response, Exception):
+                raise response
             if response.status_code == 200:
                 data = response.json()
                 print(f"✅ {endpoint}: Success")
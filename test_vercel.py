@@ -6,6 +6,20 @@ Quick test script to verify Vercel deployment is working
 import requests
 import json
 import sys
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared session: one TLS connection to Vercel reused by every endpoint test,
+# with retries for transient gateway errors (all requests here are GETs)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    # raise_on_status=False: after the last retry return the gateway response so its
+    # status and body are reported below instead of a RetryError
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                      raise_on_status=False)
+))
 
 def test_vercel_endpoint(url, endpoint):
     """Test a specific endpoint"""
@@ -13,7 +27,7 @@ def test_vercel_endpoint(url, endpoint):
     
     try:
         print(f"Testing: {full_url}")
-        response = requests.get(full_url, timeout=30)
+        response = SESSION.get(full_url, timeout=30)
         
         if response.status_code == 200:
             data = response.json()